@@ -1,205 +1,1060 @@
 import asyncio
+import copy
+import hashlib
 import json
+import os
 import re
+import ssl
+import time
+from collections import OrderedDict
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, urlunsplit
+import httpx
 from playwright.async_api import async_playwright
 import sys
 
-# Force UTF-8 encoding for console output on Windows
-if sys.platform == 'win32':
-    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
-    sys.stderr.reconfigure(encoding='utf-8', errors='replace')
+# orjson ships no PyPy wheels; fall back to stdlib json there
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
+
+# Shared by every static fetch so the CA bundle is parsed once per process
+SSL_CONTEXT = ssl.create_default_context()
+
+# Scrape result cache: in-process LRU backed by one JSON file per URL on disk
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".scrape_cache")
+CACHE_TTL = 6 * 60 * 60
+CACHE_MAX_ENTRIES = 4096
+
+# Per-origin browser contexts kept open; the least recently used idle one is closed past this
+MAX_CONTEXTS = 32
+_memory_cache = OrderedDict()
+_cache_dir_pruned = False
+
+# Fields the extractor can produce; description (raw HTML) is opt-in
+ALL_FIELDS = ("title", "price", "original_price", "description", "images", "currency")
+DEFAULT_FIELDS = ("title", "price", "original_price", "images", "currency")
+
+# Records per grouped write when streaming results to --output
+OUTPUT_BATCH = 64
+
+# Nodes whose presence means the data we extract has rendered
+READY_SELECTOR = ".price, .woocommerce-Price-amount, script[type='application/ld+json']"
+# Earliest node we can extract from; navigation hands off as soon as one is attached
+TARGET_SELECTOR = "h1, .price, script[type='application/ld+json']"
+
+# We only read DOM text, JSON-LD and image URLs, never the bytes behind them
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+TRACKER_HOSTS = re.compile(r"google-analytics|googletagmanager|doubleclick|facebook\.net|hotjar")
+
+# Selectors used by the in-page extractor, keyed by the bucket they fill.
+# Installed on each context once instead of being re-sent with every evaluate.
+SELECTORS = {
+    "wooPrice": ".price, .woocommerce-Price-amount",
+    "ins": ".price ins .amount, ins .woocommerce-Price-amount",
+    "del": ".price del .amount, del .woocommerce-Price-amount",
+    "amount": ".price .amount, .woocommerce-Price-amount",
+    "delEls": "del, .original-price, .compare-price, .strikethrough",
+    "descEls": ".product-description, .description, #description, .woocommerce-product-details__short-description",
+    "mainImg": "img.wp-post-image",
+    "galleryImgs": ".product-gallery img, .woocommerce-product-gallery__image img, .images img",
+}
+SELECTORS_INIT_SCRIPT = (
+    f"window.__SCRAPER_SELECTORS = {json.dumps(SELECTORS)};\n"
+    f"window.__SCRAPER_SELECTOR_UNION = {json.dumps(', '.join(SELECTORS.values()))};"
+)
+
+# In-page extractor, installed on each context once and invoked by name per page
+EXTRACTOR_JS = """window.extractProduct = (fields) => {
+    // Only the requested fields are extracted; the rest keep their defaults
+    const want = new Set(fields || ['title', 'price', 'original_price', 'description', 'images', 'currency']);
+    const wantPrice = want.has('price') || want.has('original_price') || want.has('currency');
+    const result = {
+        title: "",
+        price: 0,
+        original_price: 0,
+        description: "",
+        images: [],
+        currency: "INR"
+    };
+
+    // 1. TITLE
+    if (want.has('title')) {
+        const h1 = document.querySelector('h1');
+        if (h1) result.title = h1.innerText.trim();
+        else {
+            const titleMeta = document.querySelector('meta[property="og:title"]');
+            if (titleMeta) result.title = titleMeta.content;
+        }
+    }
+
+    // Walk the DOM once for every selector used below and bucket the hits,
+    // instead of re-querying the document per phase. Buckets keep document order.
+    // Selector strings are installed on the context once (see SELECTORS).
+    const BUCKETS = window.__SCRAPER_SELECTORS;
+    const found = {};
+    for (const key in BUCKETS) found[key] = [];
+    for (const el of document.querySelectorAll(window.__SCRAPER_SELECTOR_UNION)) {
+        for (const key in BUCKETS) {
+            if (el.matches(BUCKETS[key])) found[key].push(el);
+        }
+    }
+
+    // 2. PRICE & ORIGINAL PRICE
+    
+    // Helper to clean price text: take the first run of [0-9,.] and drop the
+    // thousand-separator commas in a single pass (no regex per call)
+    const cleanPrice = (text) => {
+        if (!text) return 0;
+        let digits = "";
+        let inRun = false;
+        for (let i = 0; i < text.length; i++) {
+            const c = text.charCodeAt(i);
+            const isDigit = c >= 48 && c <= 57;
+            if (isDigit || c === 46 /* . */ || c === 44 /* , */) {
+                inRun = true;
+                if (c !== 44) digits += text[i];
+            } else if (inRun) {
+                break;
+            }
+        }
+        return digits ? parseFloat(digits) : 0;
+    };
+
+    // A. Try to find WooCommerce Price Structure (most reliable for this site)
+    // Look for standard WooCommerce price block: <p class="price"> ... </p>
+    const wooPrice = found.wooPrice[0];
+    if (wantPrice && wooPrice) {
+        // Check for sale price structure: <del>Original</del> <ins>Sale</ins>
+        const ins = found.ins[0];
+        const del = found.del[0];
+        
+        if (ins && del) {
+            result.price = cleanPrice(ins.innerText);
+            result.original_price = cleanPrice(del.innerText);
+        } else {
+            // Single price
+            const amount = found.amount[0];
+            if (amount) {
+                result.price = cleanPrice(amount.innerText);
+            }
+        }
+    }
+
+    // B. Schema Fallback (only if A failed to find valid price)
+    if (wantPrice && !result.price) {
+        const schemaScripts = document.querySelectorAll('script[type="application/ld+json"]');
+        for (const script of schemaScripts) {
+            // Cheap substring check skips BreadcrumbList/Organization/WebSite blocks unparsed
+            const text = script.textContent;
+            if (!text.includes('"Product"')) continue;
+            try {
+                const json = JSON.parse(text);
+                const product = Array.isArray(json) ? json.find(i => i['@type'] === 'Product') : (json['@type'] === 'Product' ? json : null);
+                if (product) {
+                    if (product.offers) {
+                        const offer = Array.isArray(product.offers) ? product.offers[0] : product.offers;
+                        // Prefer lowPrice if available (sale price range)
+                        const price = offer.lowPrice || offer.price || offer.highPrice;
+                        result.price = parseFloat(price);
+                        result.currency = offer.priceCurrency || "INR";
+                    }
+                    if (want.has('title') && !result.title && product.name) result.title = product.name;
+                    if (want.has('description') && !result.description && product.description) result.description = product.description;
+                    if (want.has('images') && product.image) {
+                         if (Array.isArray(product.image)) result.images = product.image;
+                         else if (typeof product.image === 'string') result.images = [product.image];
+                         else if (product.image.url) result.images = [product.image.url];
+                    }
+                    break;  // First Product block wins
+                }
+            } catch (e) {}
+        }
+    }
+
+    // C. General Fallback
+    if (wantPrice && !result.price) {
+        // Walk [class*="price"] nodes in document order and stop at the first usable
+        // price instead of materialising every match. <del>/.original-price subtrees
+        // are rejected whole, so struck-through prices are never visited.
+        const walker = document.createTreeWalker(document.body || document.documentElement, NodeFilter.SHOW_ELEMENT, {
+            acceptNode: (n) => {
+                if (n.tagName === 'DEL' || n.classList.contains('original-price')) return NodeFilter.FILTER_REJECT;
+                const cls = n.getAttribute('class');
+                return cls && cls.includes('price') ? NodeFilter.FILTER_ACCEPT : NodeFilter.FILTER_SKIP;
+            }
+        });
+        for (let el = walker.nextNode(); el; el = walker.nextNode()) {
+            const text = el.innerText.trim();
+            if (/[0-9]/.test(text)) {
+                const price = cleanPrice(text);
+                if (price > 0) {
+                    result.price = price;
+                    break;
+                }
+            }
+        }
+    }
+
+    // Correct original price if it was missed
+    if (want.has('original_price') && !result.original_price) {
+        for (const el of found.delEls) {
+            const price = cleanPrice(el.innerText);
+            if (price > result.price) {
+                result.original_price = price;
+                break;
+            }
+        }
+    }
+
+    // 3. DESCRIPTION (innerHTML can be large; skipped unless requested)
+    if (want.has('description') && !result.description) {
+        for (const el of found.descEls) {
+            if (el.innerText.length > 50) {
+                result.description = el.innerHTML; // Keep HTML for description
+                break;
+            }
+        }
+    }
+    // Meta desc fallback
+    if (want.has('description') && !result.description) {
+        const metaDesc = document.querySelector('meta[name="description"]');
+        if (metaDesc) result.description = metaDesc.content;
+    }
+
+    // 4. IMAGES
+    if (want.has('images') && result.images.length === 0) {
+         // Look for gallery images
+        const imgSet = new Set();
+        
+        // Main image
+        const mainImg = found.mainImg[0];
+        if (mainImg) {
+            imgSet.add(mainImg.src || mainImg.dataset.src);
+        }
+
+        for (const img of found.galleryImgs) {
+            const src = img.src || img.dataset.src;
+            if (src && src.startsWith('http')) imgSet.add(src);
+        }
+        
+        if (imgSet.size === 0) {
+            // Share/preload metadata names the hero image without touching layout
+            document.querySelectorAll('meta[property="og:image"], meta[name="twitter:image"], link[rel="preload"][as="image"]').forEach(e => {
+                const src = e.content || e.href;
+                if (src) imgSet.add(src);
+            });
+        }
+        
+        if (imgSet.size === 0) {
+             // Fallback to all large images. Image requests are blocked, so naturalWidth
+             // is 0 and many themes set no width/height: a srcset offering a candidate
+             // wider than 300px also counts, and as a last resort the laid-out box does.
+             const srcsetWidth = (img) => Math.max(0, ...(img.getAttribute('srcset') || '').split(',')
+                 .map(c => parseInt((c.trim().split(/\s+/)[1] || '').match(/^(\d+)w$/)?.[1]) || 0));
+             document.querySelectorAll('img').forEach(img => {
+                 if (!img.src) return;
+                 const w = img.naturalWidth || parseInt(img.getAttribute('width')) || 0;
+                 const h = img.naturalHeight || parseInt(img.getAttribute('height')) || 0;
+                 if ((w > 300 && h > 300) || srcsetWidth(img) > 300) {
+                     imgSet.add(img.src);
+                     return;
+                 }
+                 const rect = img.getBoundingClientRect();
+                 if (rect.width > 300 && rect.height > 300) imgSet.add(img.src);
+             });
+        }
+        result.images = Array.from(imgSet);
+    }
+
+    return result;
+};"""
+
+async def block_heavy_requests(route):
+    """Aborts requests for assets and trackers that extraction never needs."""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or TRACKER_HOSTS.search(request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# Elements HTMLParser reports a start tag for but never closes
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# Classes the extractor's delEls selector treats as a struck-through price
+ORIGINAL_PRICE_CLASSES = {"original-price", "compare-price", "strikethrough"}
+# Classes (and the id) of the extractor's descEls selector
+DESCRIPTION_CLASSES = {"product-description", "description", "woocommerce-product-details__short-description"}
+# Containers whose <img>s the extractor's galleryImgs selector picks up
+GALLERY_CLASSES = {"product-gallery", "woocommerce-product-gallery__image", "images"}
+
+class StaticProductParser(HTMLParser):
+    """
+    Collects from server-rendered HTML every node EXTRACTOR_JS reads (see SELECTORS): first <h1>,
+    meta/preload tags, JSON-LD, the WooCommerce and generic price nodes, description blocks and images.
+    Everything is kept in document order so extract_static_product can apply the same precedence.
+    """
+
+    def __init__(self, base_url=None):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.h1 = None
+        self.meta = {}
+        self.json_ld = []
+        self.share_images = []  # og:image, twitter:image, preload images
+        self.has_woo_price = False
+        self.ins_amount = None
+        self.del_amount = None
+        self.amount = None
+        self.del_texts = []
+        self.price_texts = []  # [class*="price"] outside <del>/.original-price
+        self.descriptions = []  # (text, inner_html) of descEls
+        self.main_image = None
+        self.gallery_images = []
+        self.images = []  # every <img> as (src, width, height, srcset)
+        self._html = ""
+        self._line_starts = [0]
+        self._h1_parts = None
+        self._ld_parts = None
+        # Open elements as (tag, inside .price, inside <ins>, inside <del>, inside del/.original-price, inside gallery)
+        self._stack = []
+        # Elements whose text is being collected: [depth, field, parts, inner_html_start, slot]
+        self._captures = []
+
+    def parse(self, html):
+        self._html = html
+        self._line_starts = [0] + [m.end() for m in re.finditer("\n", html)]
+        self.feed(html)
+        self.close()
+        return self
+
+    def _offset(self):
+        line, col = self.getpos()
+        return self._line_starts[line - 1] + col
+
+    def _img_src(self, attrs):
+        # img.src is resolved against the page URL; data-src is read as written
+        src = attrs.get("src")
+        if src:
+            return urljoin(self.base_url, src) if self.base_url else src
+        return attrs.get("data-src")
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = set((attrs.get("class") or "").split())
+        in_price, in_ins, in_del, in_struck, in_gallery = self._stack[-1][1:] if self._stack else (False,) * 5
+        if tag == "h1" and self.h1 is None:
+            self._h1_parts = []
+        elif tag == "meta":
+            key = (attrs.get("property") or attrs.get("name") or "").lower()
+            if key and attrs.get("content"):
+                self.meta.setdefault(key, attrs["content"])
+            if attrs.get("content") and (attrs.get("property") == "og:image" or attrs.get("name") == "twitter:image"):
+                self.share_images.append(attrs["content"])
+        elif tag == "link":
+            if "preload" in (attrs.get("rel") or "").split() and attrs.get("as") == "image" and attrs.get("href"):
+                href = attrs["href"]
+                self.share_images.append(urljoin(self.base_url, href) if self.base_url else href)
+        elif tag == "script" and (attrs.get("type") or "").lower() == "application/ld+json":
+            self._ld_parts = []
+        elif tag == "img":
+            src = self._img_src(attrs)
+            if "wp-post-image" in classes and self.main_image is None:
+                self.main_image = src or ""
+            if in_gallery and src:
+                self.gallery_images.append(src)
+            if attrs.get("src"):
+                self.images.append((self._img_src(attrs), attrs.get("width"), attrs.get("height"), attrs.get("srcset")))
+        if tag in VOID_TAGS:
+            return
+
+        wc_amount = "woocommerce-Price-amount" in classes
+        price_amount = in_price and "amount" in classes
+        if "price" in classes or wc_amount:
+            self.has_woo_price = True
+        # .price ins .amount, ins .woocommerce-Price-amount
+        if in_ins and (price_amount or wc_amount) and self.ins_amount is None:
+            self._capture("ins_amount")
+        # .price del .amount, del .woocommerce-Price-amount
+        if in_del and (price_amount or wc_amount) and self.del_amount is None:
+            self._capture("del_amount")
+        # .price .amount, .woocommerce-Price-amount
+        if (price_amount or wc_amount) and self.amount is None:
+            self._capture("amount")
+        # del, .original-price, .compare-price, .strikethrough
+        if tag == "del" or classes & ORIGINAL_PRICE_CLASSES:
+            self._capture("del_texts")
+        # General fallback walks [class*="price"] and skips del/.original-price subtrees whole
+        struck = in_struck or tag == "del" or "original-price" in classes
+        if not struck and "price" in (attrs.get("class") or ""):
+            self._capture("price_texts")
+        # .product-description, .description, #description, .woocommerce-product-details__short-description
+        if classes & DESCRIPTION_CLASSES or attrs.get("id") == "description":
+            self._capture("descriptions", self._offset() + len(self.get_starttag_text() or ""))
+        self._stack.append((tag, in_price or "price" in classes, in_ins or tag == "ins", in_del or tag == "del",
+                            struck, in_gallery or bool(classes & GALLERY_CLASSES)))
+
+    def _capture(self, field, inner_html_start=None):
+        if field in ("ins_amount", "del_amount", "amount") and any(c[1] == field for c in self._captures):
+            return
+        slot = None
+        if field in ("del_texts", "price_texts", "descriptions"):
+            # Reserve the slot now so nested matches stay in document (start tag) order
+            slot = len(getattr(self, field))
+            getattr(self, field).append(None)
+        self._captures.append([len(self._stack), field, [], inner_html_start, slot])
+
+    def handle_endtag(self, tag):
+        if tag == "h1" and self._h1_parts is not None:
+            self.h1 = " ".join("".join(self._h1_parts).split())
+            self._h1_parts = None
+        elif tag == "script" and self._ld_parts is not None:
+            self.json_ld.append("".join(self._ld_parts))
+            self._ld_parts = None
+        # Close up to the matching open element; stray end tags are ignored
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+        else:
+            return
+        while self._captures and self._captures[-1][0] >= len(self._stack):
+            _, field, parts, inner_html_start, slot = self._captures.pop()
+            text = "".join(parts)
+            if field == "descriptions":
+                self.descriptions[slot] = (text, self._html[inner_html_start:self._offset()])
+            elif slot is not None:
+                getattr(self, field)[slot] = text
+            elif getattr(self, field) is None:
+                setattr(self, field, text)
+
+    def handle_data(self, data):
+        if self._h1_parts is not None:
+            self._h1_parts.append(data)
+        elif self._ld_parts is not None:
+            self._ld_parts.append(data)
+            return
+        # innerText leaves out script and style bodies
+        if self._stack and self._stack[-1][0] in ("script", "style"):
+            return
+        for capture in self._captures:
+            capture[2].append(data)
+
+def _to_float(value):
+    """Mirrors JS parseFloat closely enough for schema prices ("1299", "1299.00", 1299)."""
+    match = re.match(r"\s*([0-9]+(?:\.[0-9]+)?)", str(value or ""))
+    return float(match.group(1)) if match else 0
+
+def _clean_price(text):
+    """Port of the extractor's cleanPrice: first run of [0-9,.] with thousand separators dropped."""
+    match = re.search(r"[0-9.,]+", text or "")
+    return _to_float(match.group().replace(",", "")) if match else 0
+
+def _attr_int(value):
+    """parseInt of a width/height attribute (0 when missing or not numeric)."""
+    match = re.match(r"\s*([0-9]+)", value or "")
+    return int(match.group(1)) if match else 0
+
+def _srcset_width(srcset):
+    """Widest `<n>w` candidate in a srcset (0 when there is none)."""
+    widths = [0]
+    for candidate in (srcset or "").split(","):
+        descriptor = candidate.split()[1:2]
+        match = re.match(r"([0-9]+)w$", descriptor[0]) if descriptor else None
+        if match:
+            widths.append(int(match.group(1)))
+    return max(widths)
+
+def extract_static_product(html, fields=ALL_FIELDS, base_url=None):
+    """
+    Python port of EXTRACTOR_JS for server-rendered pages: the same fields, selectors and
+    precedence, so a page gives the same result whichever path extracts it.
+    `base_url` resolves relative img src/href the way the browser does.
+    """
+    parser = StaticProductParser(base_url).parse(html)
+    want = set(fields or ALL_FIELDS)
+    want_price = bool(want & {"price", "original_price", "currency"})
+    result = {
+        "title": "",
+        "price": 0,
+        "original_price": 0,
+        "description": "",
+        "images": [],
+        "currency": "INR"
+    }
+
+    # 1. TITLE
+    if "title" in want:
+        result["title"] = parser.h1 if parser.h1 is not None else parser.meta.get("og:title", "")
+
+    # 2A. WooCommerce price block: <del>original</del> <ins>sale</ins>, else the single amount
+    if want_price and parser.has_woo_price:
+        if parser.ins_amount is not None and parser.del_amount is not None:
+            result["price"] = _clean_price(parser.ins_amount)
+            result["original_price"] = _clean_price(parser.del_amount)
+        elif parser.amount is not None:
+            result["price"] = _clean_price(parser.amount)
+
+    # 2B. Schema fallback, only when the price block gave nothing
+    if want_price and not result["price"]:
+        for raw in parser.json_ld:
+            if '"Product"' not in raw:
+                continue
+            try:
+                data = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(data, list):
+                product = next((i for i in data if isinstance(i, dict) and i.get("@type") == "Product"), None)
+            else:
+                product = data if isinstance(data, dict) and data.get("@type") == "Product" else None
+            if not product:
+                continue
+            offers = product.get("offers")
+            if offers:
+                offer = offers[0] if isinstance(offers, list) else offers
+                result["price"] = _to_float(offer.get("lowPrice") or offer.get("price") or offer.get("highPrice"))
+                result["currency"] = offer.get("priceCurrency") or "INR"
+            if "title" in want and not result["title"] and product.get("name"):
+                result["title"] = product["name"]
+            if "description" in want and not result["description"] and product.get("description"):
+                result["description"] = product["description"]
+            image = product.get("image")
+            if "images" in want and image:
+                if isinstance(image, list):
+                    result["images"] = image
+                elif isinstance(image, str):
+                    result["images"] = [image]
+                elif isinstance(image, dict) and image.get("url"):
+                    result["images"] = [image["url"]]
+            break  # First Product block wins
+
+    # 2C. General fallback: first [class*="price"] node holding a usable number
+    if want_price and not result["price"]:
+        for text in parser.price_texts:
+            if text and re.search(r"[0-9]", text):
+                price = _clean_price(text.strip())
+                if price > 0:
+                    result["price"] = price
+                    break
+
+    # Correct original price if it was missed
+    if "original_price" in want and not result["original_price"]:
+        for text in parser.del_texts:
+            price = _clean_price(text)
+            if price > result["price"]:
+                result["original_price"] = price
+                break
+
+    # 3. DESCRIPTION
+    if "description" in want and not result["description"]:
+        for text, inner_html in filter(None, parser.descriptions):
+            if len(text) > 50:
+                result["description"] = inner_html
+                break
+    if "description" in want and not result["description"]:
+        result["description"] = parser.meta.get("description", "")
+
+    # 4. IMAGES
+    if "images" in want and not result["images"]:
+        images = {}  # ordered set, like the extractor's Set
+        if parser.main_image is not None and parser.main_image:
+            images[parser.main_image] = None
+        for src in parser.gallery_images:
+            if src.startswith("http"):
+                images[src] = None
+        if not images:
+            images.update(dict.fromkeys(parser.share_images))
+        if not images:
+            # The browser also accepts images laid out larger than 300px; static HTML has no layout
+            for src, width, height, srcset in parser.images:
+                if (_attr_int(width) > 300 and _attr_int(height) > 300) or _srcset_width(srcset) > 300:
+                    images[src] = None
+        result["images"] = list(images)
+    return result
+
+async def try_static(url, timeout=15, client=None, fields=ALL_FIELDS):
+    """
+    Fetches the page over plain HTTP and extracts it without a browser.
+    Pass a shared `client` (see BrowserPool.get_http_client) to reuse connections across a batch.
+    Returns None when the page needs JavaScript to expose a title and price.
+    """
+    try:
+        if client is None:
+            async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, headers={"User-Agent": USER_AGENT},
+                                         verify=SSL_CONTEXT) as own_client:
+                response = await own_client.get(url)
+        else:
+            response = await client.get(url, timeout=timeout)
+        if response.status_code != 200:
+            return None
+        data = extract_static_product(response.text, fields, base_url=str(response.url))
+    except Exception:
+        return None
+    if data["title"] and data["price"] > 0:
+        return data
+    return None
+
+class BrowserPool:
+    """
+    Keeps one Chromium instance alive and one context per origin, so each scrape
+    only opens a page and same-site URLs share connections, cookies and HTTP cache.
+    """
+
+    def __init__(self, headless=True, max_pages=8):
+        self.headless = headless
+        self.playwright = None
+        self.browser = None
+        self.contexts = OrderedDict()  # origin -> context, least recently used first
+        self._contexts_lock = asyncio.Lock()
+        self.http_client = None  # shared by static fetches, see get_http_client
+        # Bounds how many pages may be open on the shared browser at once
+        self.page_slots = asyncio.Semaphore(max_pages)
+
+    async def start(self):
+        if self.browser is None:
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        return self
+
+    def get_http_client(self):
+        """The pool's HTTP client for static fetches, so a batch reuses connections instead of one client per URL."""
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(follow_redirects=True, headers={"User-Agent": USER_AGENT},
+                                                 verify=SSL_CONTEXT)
+        return self.http_client
+
+    async def get_context(self, origin):
+        """
+        Returns the context for `origin`, creating and instrumenting it on first use.
+        Past MAX_CONTEXTS the least recently used context with no open pages is closed.
+        """
+        async with self._contexts_lock:
+            context = self.contexts.get(origin)
+            if context is not None:
+                self.contexts.move_to_end(origin)
+                return context
+            if len(self.contexts) >= MAX_CONTEXTS:
+                idle = next((o for o, c in self.contexts.items() if not c.pages), None)
+                if idle is not None:
+                    await self.contexts.pop(idle).close()
+            context = await self.browser.new_context(user_agent=USER_AGENT, bypass_csp=False)
+            await context.route("**/*", block_heavy_requests)
+            await context.add_init_script(SELECTORS_INIT_SCRIPT + "\n" + EXTRACTOR_JS)
+            self.contexts[origin] = context
+            return context
+
+    async def close_contexts(self):
+        """Drops every per-origin context but keeps the browser running (bounds memory on long runs)."""
+        async with self._contexts_lock:
+            for context in self.contexts.values():
+                await context.close()
+            self.contexts.clear()
+
+    async def close(self):
+        await self.close_contexts()
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
 class GenericProductScraper:
-    def __init__(self, url, headless=True):
+    def __init__(self, url, pool=None, headless=True, static_first=True, fields=DEFAULT_FIELDS):
         self.url = url
+        self.pool = pool
         self.headless = headless
+        self.static_first = static_first
+        self.fields = tuple(fields)
 
     async def scrape(self):
-        async with async_playwright() as p:
-            # Launch browser
-            browser = await p.chromium.launch(headless=self.headless)
-            context = await browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-            )
-            page = await context.new_page()
+        # Server-rendered pages don't need a browser at all
+        data = await self.scrape_static()
+        if data:
+            return data
+
+        # Callers without a pool get a throwaway one (single-URL usage)
+        if self.pool is None:
+            async with BrowserPool(headless=self.headless) as pool:
+                return await self._scrape(pool)
+        return await self._scrape(self.pool)
+
+    async def scrape_static(self):
+        """The browserless attempt on its own; None when disabled or when the page needs JavaScript."""
+        if not self.static_first:
+            return None
+        client = self.pool.get_http_client() if self.pool is not None else None
+        data = await try_static(self.url, client=client, fields=self.fields)
+        if data:
+            emit(f"Static fetch OK for {self.url}")
+            print_scraped(data)
+        return data
+
+    async def wait_for_content(self, page, deadline=3.0):
+        """Waits until the network is idle or price/schema markup appears, capped at `deadline` seconds."""
+        waiters = [
+            asyncio.create_task(page.wait_for_load_state("networkidle")),
+            asyncio.create_task(page.wait_for_selector(READY_SELECTOR, state="attached")),
+        ]
+        try:
+            await asyncio.wait(waiters, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+
+    async def open_page(self, pool):
+        """Opens a page in the origin's shared context and navigates it to the URL."""
+        parts = urlsplit(self.url)
+        context = await pool.get_context(f"{parts.scheme}://{parts.netloc}".lower())
+        page = await context.new_page()
+        try:
+            emit(f"Opening {self.url}...")
+            # Return on first response byte, then wait only for the nodes we extract
+            response = await page.goto(self.url, timeout=60000, wait_until="commit")
+            
+            # Check for 404
+            if response and response.status == 404:
+                emit(f"Server returned 404 for {self.url}")
+                raise Exception("404 Not Found")
             
             try:
-                print(f"Opening {self.url}...")
-                response = await page.goto(self.url, timeout=60000, wait_until="domcontentloaded")
-                
-                # Check for 404
-                if response and response.status == 404:
-                    print(f"Server returned 404 for {self.url}")
-                    raise Exception("404 Not Found")
-                
-                await page.wait_for_timeout(3000) # Wait for dynamic content
-                
-                # Extract Data using JavaScript for robust DOM access
-                data = await page.evaluate("""() => {
-                    const result = {
-                        title: "",
-                        price: 0,
-                        original_price: 0,
-                        description: "",
-                        images: [],
-                        currency: "INR"
-                    };
-
-                    // 1. TITLE
-                    const h1 = document.querySelector('h1');
-                    if (h1) result.title = h1.innerText.trim();
-                    else {
-                        const titleMeta = document.querySelector('meta[property="og:title"]');
-                        if (titleMeta) result.title = titleMeta.content;
-                    }
+                await page.wait_for_selector(TARGET_SELECTOR, state="attached", timeout=10000)
+            except Exception:
+                pass  # Extraction still has meta-tag fallbacks
+            
+            await self.wait_for_content(page)
+            return page
+        except BaseException:
+            await page.close()
+            raise
 
-                    // 2. PRICE & ORIGINAL PRICE
-                    
-                    // Helper to clean price text
-                    const cleanPrice = (text) => {
-                        if (!text) return 0;
-                        // Remove currency symbols and non-numeric characters except dot
-                        const match = text.match(/[0-9,.]+/);
-                        if (!match) return 0;
-                        // Handle comma as thousand separator
-                        return parseFloat(match[0].replace(/,/g, ''));
-                    };
-
-                    // A. Try to find WooCommerce Price Structure (most reliable for this site)
-                    // Look for standard WooCommerce price block: <p class="price"> ... </p>
-                    const wooPrice = document.querySelector('.price, .woocommerce-Price-amount');
-                    if (wooPrice) {
-                        // Check for sale price structure: <del>Original</del> <ins>Sale</ins>
-                        const ins = document.querySelector('.price ins .amount, ins .woocommerce-Price-amount');
-                        const del = document.querySelector('.price del .amount, del .woocommerce-Price-amount');
-                        
-                        if (ins && del) {
-                            result.price = cleanPrice(ins.innerText);
-                            result.original_price = cleanPrice(del.innerText);
-                        } else {
-                            // Single price
-                            const amount = document.querySelector('.price .amount, .woocommerce-Price-amount');
-                            if (amount) {
-                                result.price = cleanPrice(amount.innerText);
-                            }
-                        }
-                    }
+    async def extract(self, page):
+        # Extract Data using the extractor installed on the context
+        data = await page.evaluate("fields => extractProduct(fields)", list(self.fields))
+        print_scraped(data)
+        return data
 
-                    // B. Schema Fallback (only if A failed to find valid price)
-                    if (!result.price) {
-                        const schemaScripts = document.querySelectorAll('script[type="application/ld+json"]');
-                        for (const script of schemaScripts) {
-                            try {
-                                const json = JSON.parse(script.innerText);
-                                const product = Array.isArray(json) ? json.find(i => i['@type'] === 'Product') : (json['@type'] === 'Product' ? json : null);
-                                if (product) {
-                                    if (product.offers) {
-                                        const offer = Array.isArray(product.offers) ? product.offers[0] : product.offers;
-                                        // Prefer lowPrice if available (sale price range)
-                                        const price = offer.lowPrice || offer.price || offer.highPrice;
-                                        result.price = parseFloat(price);
-                                        result.currency = offer.priceCurrency || "INR";
-                                    }
-                                    if (!result.title && product.name) result.title = product.name;
-                                    if (!result.description && product.description) result.description = product.description;
-                                    if (product.image) {
-                                         if (Array.isArray(product.image)) result.images = product.image;
-                                         else if (typeof product.image === 'string') result.images = [product.image];
-                                         else if (product.image.url) result.images = [product.image.url];
-                                    }
-                                }
-                            } catch (e) {}
-                        }
-                    }
+    async def _scrape(self, pool):
+        async with pool.page_slots:
+            try:
+                page = await self.open_page(pool)
+            except Exception as e:
+                emit(f"Error scraping {self.url}: {e}")
+                return None
+            try:
+                return await self.extract(page)
+            except Exception as e:
+                emit(f"Error scraping {self.url}: {e}")
+                return None
+            finally:
+                await page.close()
 
-                    // C. General Fallback
-                    if (!result.price) {
-                        const priceEls = document.querySelectorAll('.current-price, [class*="price"]');
-                        for (const el of priceEls) {
-                            const text = el.innerText.trim();
-                            if (text.match(/[0-9]/) && !el.closest('del') && !el.closest('.original-price')) {
-                                const price = cleanPrice(text);
-                                if (price > 0) {
-                                    result.price = price;
-                                    break;
-                                }
-                            }
-                        }
-                    }
+def emit(message):
+    """
+    Writes one line to stdout as UTF-8 bytes, whatever the console code page is.
+    A replaced stdout without a byte buffer (StringIO, some IDE consoles) gets text instead.
+    """
+    buffer = getattr(sys.stdout, "buffer", None)
+    if buffer is None:
+        if isinstance(message, bytes):
+            message = message.decode("utf-8", "replace")
+        sys.stdout.write(message + "\n")
+        sys.stdout.flush()
+        return
+    if isinstance(message, str):
+        message = message.encode("utf-8", "replace")
+    sys.stdout.flush()  # keep ordering with print() output from callers
+    buffer.write(message + b"\n")
+    buffer.flush()
 
-                    // Correct original price if it was missed
-                    if (!result.original_price) {
-                        const delEls = document.querySelectorAll('del, .original-price, .compare-price, .strikethrough');
-                        for (const el of delEls) {
-                            const price = cleanPrice(el.innerText);
-                            if (price > result.price) {
-                                result.original_price = price;
-                                break;
-                            }
-                        }
-                    }
+def print_scraped(data):
+    """Writes the scraped payload as indented UTF-8 JSON straight to the stdout byte stream."""
+    if orjson is None:
+        emit(f"Scraped Data: {json.dumps(data, indent=2, ensure_ascii=False)}")
+    else:
+        emit(b"Scraped Data: " + orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
-                    // 3. DESCRIPTION
-                    if (!result.description) {
-                        const descEls = document.querySelectorAll('.product-description, .description, #description, .woocommerce-product-details__short-description');
-                        for (const el of descEls) {
-                            if (el.innerText.length > 50) {
-                                result.description = el.innerHTML; // Keep HTML for description
-                                break;
-                            }
-                        }
-                    }
-                    // Meta desc fallback
-                    if (!result.description) {
-                        const metaDesc = document.querySelector('meta[name="description"]');
-                        if (metaDesc) result.description = metaDesc.content;
-                    }
+def normalize_url(url):
+    """Canonical cache key for a product URL (lower-cased host, no fragment or trailing slash)."""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
 
-                    // 4. IMAGES
-                    if (result.images.length === 0) {
-                         // Look for gallery images
-                        const galleryImgs = document.querySelectorAll('.product-gallery img, .woocommerce-product-gallery__image img, .images img');
-                        const imgSet = new Set();
-                        
-                        // Main image
-                        const mainImg = document.querySelector('img.wp-post-image');
-                        if (mainImg) {
-                            imgSet.add(mainImg.src || mainImg.dataset.src);
-                        }
-
-                        for (const img of galleryImgs) {
-                            const src = img.src || img.dataset.src;
-                            if (src && src.startsWith('http')) imgSet.add(src);
-                        }
-                        
-                        if (imgSet.size === 0) {
-                             // Fallback to all large images
-                             document.querySelectorAll('img').forEach(img => {
-                                 if (img.width > 300 && img.height > 300) imgSet.add(img.src);
-                             });
-                        }
-                        result.images = Array.from(imgSet);
-                    }
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest() + ".json")
+
+def load_cached_result(key):
+    """
+    Returns a cached scrape younger than CACHE_TTL, checking memory before disk.
+    The caller gets its own copy, so mutating it can't corrupt later hits.
+    """
+    entry = _memory_cache.get(key)
+    if entry is None:
+        path = _cache_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        # Truncated or foreign files are a miss, and removed so they aren't parsed again
+        if not (isinstance(entry, dict) and isinstance(entry.get("ts"), (int, float)) and "data" in entry):
+            _remove_quietly(path)
+            return None
+    if time.time() - entry["ts"] > CACHE_TTL:
+        _memory_cache.pop(key, None)
+        _remove_quietly(_cache_path(key))
+        return None
+    _memory_cache[key] = entry
+    _memory_cache.move_to_end(key)
+    return copy.deepcopy(entry["data"])
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def prune_cache_dir():
+    """
+    Deletes cache files older than CACHE_TTL, then the oldest ones beyond CACHE_MAX_ENTRIES,
+    so the directory doesn't grow with every URL ever scraped.
+    """
+    try:
+        entries = [entry for entry in os.scandir(CACHE_DIR) if entry.name.endswith(".json")]
+    except OSError:
+        return
+    cutoff = time.time() - CACHE_TTL
+    live = []
+    for entry in entries:
+        try:
+            mtime = entry.stat().st_mtime
+        except OSError:
+            continue
+        if mtime < cutoff:
+            _remove_quietly(entry.path)
+        else:
+            live.append((mtime, entry.path))
+    if len(live) > CACHE_MAX_ENTRIES:
+        live.sort()
+        for _, path in live[:len(live) - CACHE_MAX_ENTRIES]:
+            _remove_quietly(path)
+
+def save_cached_result(key, data):
+    global _cache_dir_pruned
+    # Stored as a copy: the caller keeps (and may mutate) the dict it passed in
+    entry = {"ts": time.time(), "data": copy.deepcopy(data)}
+    _memory_cache[key] = entry
+    _memory_cache.move_to_end(key)
+    if len(_memory_cache) > CACHE_MAX_ENTRIES:
+        _memory_cache.popitem(last=False)
+    # Pruned once per process, on the first write
+    if not _cache_dir_pruned:
+        _cache_dir_pruned = True
+        prune_cache_dir()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(_cache_path(key), "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+    except OSError:
+        pass
+
+def cache_key(url, fields):
+    """Results for different field sets are cached apart."""
+    return normalize_url(url) + "|" + ",".join(sorted(fields))
+
+async def fetch_generic_product_data(url, pool=None, force=False, fields=DEFAULT_FIELDS):
+    key = cache_key(url, fields)
+    if not force:
+        cached = load_cached_result(key)
+        if cached is not None:
+            return cached
+    scraper = GenericProductScraper(url, pool=pool, fields=fields)
+    data = await scraper.scrape()
+    if data:
+        save_cached_result(key, data)
+    return data
+
+def _dumps_line(record):
+    if orjson is None:
+        return (json.dumps(record) + "\n").encode("utf-8")
+    return orjson.dumps(record) + b"\n"
+
+def _write_all(fd, chunks):
+    """One writev per batch where the OS has it (POSIX), a single joined write otherwise."""
+    if hasattr(os, "writev"):
+        written = os.writev(fd, chunks)
+        total = sum(len(c) for c in chunks)
+        if written == total:
+            return
+        data = b"".join(chunks)[written:]
+    else:
+        data = b"".join(chunks)
+    while data:
+        data = data[os.write(fd, data):]
+
+async def write_results(queue, path, batch_size=OUTPUT_BATCH):
+    """Drains records from `queue` into `path` as JSON lines until a None sentinel arrives."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        done = False
+        while not done:
+            batch = [await queue.get()]
+            while len(batch) < batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                done = True
+            if batch:
+                _write_all(fd, [_dumps_line(record) for record in batch])
+    finally:
+        os.close(fd)
+
+async def scrape_many(urls, pool, concurrency=8, queue=None):
+    """
+    Scrape several URLs concurrently on the shared browser, preserving input order.
+    When `queue` is given, each {"url", "data"} record is also pushed to it as soon as it's ready.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
 
-                    return result;
-                }""")
-                
-                print(f"Scraped Data: {json.dumps(data, indent=2)}")
-                return data
+    async def _one(url):
+        async with semaphore:
+            data = await fetch_generic_product_data(url, pool)
+        if queue is not None:
+            await queue.put({"url": url, "data": data})
+        return data
 
+    return await asyncio.gather(*[_one(url) for url in urls])
+
+async def scrape_stream(urls, pool, concurrency=8):
+    """
+    Yields {"url", "data"} records in completion order, so callers can consume and drop
+    each result as it lands instead of holding the whole batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(url):
+        async with semaphore:
+            return {"url": url, "data": await fetch_generic_product_data(url, pool)}
+
+    tasks = [asyncio.create_task(_one(url)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def scrape_pipelined(urls, pool, queue=None, fields=DEFAULT_FIELDS):
+    """
+    Scrape URLs one after another, but navigate the next URL while the current one is
+    being extracted, so navigation latency drops off the critical path.
+    Goes cache -> static -> browser like fetch_generic_product_data; only browser
+    misses take a page slot.
+    """
+    ready = asyncio.Queue(maxsize=2)
+
+    async def release(page):
+        try:
+            await page.close()
+        finally:
+            pool.page_slots.release()
+
+    async def prefetch():
+        for url in urls:
+            scraper = GenericProductScraper(url, pool=pool, fields=fields)
+            key = cache_key(url, fields)
+            data = load_cached_result(key)
+            if data is None:
+                data = await scraper.scrape_static()
+                if data:
+                    save_cached_result(key, data)
+            if data:
+                await ready.put((scraper, key, None, data))
+                continue
+
+            await pool.page_slots.acquire()
+            try:
+                page = await scraper.open_page(pool)
             except Exception as e:
-                print(f"Error scraping {self.url}: {e}")
-                return None
-            finally:
-                await browser.close()
+                emit(f"Error scraping {url}: {e}")
+                pool.page_slots.release()
+                page = None
+            except BaseException:
+                pool.page_slots.release()  # open_page already closed its page
+                raise
+            try:
+                await ready.put((scraper, key, page, None))
+            except BaseException:
+                # Cancelled while the queue was full: the page never reached the consumer
+                if page is not None:
+                    await release(page)
+                raise
+        await ready.put(None)
+
+    prefetcher = asyncio.create_task(prefetch())
+    results = []
+    try:
+        while (item := await ready.get()) is not None:
+            scraper, key, page, data = item
+            if page is not None:
+                try:
+                    data = await scraper.extract(page)
+                except Exception as e:
+                    emit(f"Error scraping {scraper.url}: {e}")
+                finally:
+                    await release(page)
+                if data:
+                    save_cached_result(key, data)
+            if queue is not None:
+                await queue.put({"url": scraper.url, "data": data})
+            results.append(data)
+    finally:
+        prefetcher.cancel()
+        await asyncio.gather(prefetcher, return_exceptions=True)
+        # Pages prefetched but never consumed still hold a slot
+        while not ready.empty():
+            item = ready.get_nowait()
+            if item is not None and item[2] is not None:
+                await release(item[2])
+    return results
 
-async def fetch_generic_product_data(url):
-    scraper = GenericProductScraper(url)
-    return await scraper.scrape()
+async def main(urls, concurrency=8, output=None, pipeline=False):
+    async with BrowserPool(max_pages=concurrency) as pool:
+        queue = writer = None
+        if output:
+            queue = asyncio.Queue()
+            writer = asyncio.create_task(write_results(queue, output))
+        try:
+            if pipeline:
+                await scrape_pipelined(urls, pool, queue)
+                return
+            async for record in scrape_stream(urls, pool, concurrency):
+                if queue is not None:
+                    await queue.put(record)
+        finally:
+            if writer is not None:
+                await queue.put(None)
+                await writer
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument("url", help="Product URL")
+    parser.add_argument("urls", nargs="+", help="Product URL(s)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Pages scraped in parallel")
+    parser.add_argument("--output", help="Append results to this JSON Lines file")
+    parser.add_argument("--pipeline", action="store_true", help="Scrape serially, prefetching the next page during extraction")
     args = parser.parse_args()
-    asyncio.run(fetch_generic_product_data(args.url))
+    asyncio.run(main(args.urls, args.concurrency, args.output, args.pipeline))
\ No newline at end of file
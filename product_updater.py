@@ -10,28 +10,55 @@ Features:
 - tqdm progress bar with ETA (resumes correctly after stop/restart)
 - Concise, important-only console logging
 - Progress tracking in progress.json (resume from where it stopped)
-- Error logging in error.json with product URLs
+- Error logging in error.ndjson (append-only) with product URLs, consolidated into error.json on exit
 """
 
 import asyncio
+import atexit
+import hashlib
+import importlib.util
+import io
 import json
 import os
+import re
+import ssl
 import sys
 import time
+from collections import OrderedDict
 import httpx
 import psycopg2
-from psycopg2.extras import Json, RealDictCursor
+from psycopg2.extras import Json, execute_values
 from datetime import datetime
+from decimal import Decimal
+from html import escape
+from html.parser import HTMLParser
 from urllib.parse import urlparse
 from dotenv import load_dotenv
+from playwright.async_api import async_playwright
 from tqdm import tqdm
 
+# orjson ships no PyPy wheels; fall back to stdlib json there
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bytes-or-str JSON decoder picked once; both raise a json.JSONDecodeError subclass
+json_loads = orjson.loads if orjson is not None else json.loads
+
+# Optional: pysimdjson lets us pull the few fields we need without building the full document
+try:
+    import simdjson
+    _simdjson_parser = simdjson.Parser()
+except ImportError:
+    simdjson = None
+
 # Import the size chart scraper
-from scraper import SizeChartScraper
+from scraper import PAGE_SCRIPTS_INIT, SizeChartScraper, get_brand_cache, save_brand_cache, touch_brand
 
 # Import generic product scraper for non-Shopify fallback
 try:
-    from generic_product_scraper import fetch_generic_product_data
+    from generic_product_scraper import BrowserPool, fetch_generic_product_data, ALL_FIELDS as GENERIC_FIELDS
 except ImportError:
     fetch_generic_product_data = None
 
@@ -76,6 +103,72 @@ load_dotenv()
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROGRESS_FILE = os.path.join(SCRIPT_DIR, "progress.json")
 ERROR_FILE = os.path.join(SCRIPT_DIR, "error.json")
+ERROR_LOG_FILE = os.path.join(SCRIPT_DIR, "error.ndjson")
+DOMAIN_CACHE_FILE = os.path.join(SCRIPT_DIR, "domain_cache.json")
+# A host cached as not Shopify is probed again once its entry is older than this
+NOT_SHOPIFY_TTL = 7 * 24 * 60 * 60
+
+# Minimum seconds between routine (non-forced) progress.json writes
+PROGRESS_SAVE_INTERVAL = 2.0
+_last_progress_save = 0.0
+_last_saved_state = None
+
+# Append-only error log handle, opened on first use (see open_error_log)
+_error_log = None
+
+SHOPIFY_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+    "Accept": "application/json, text/plain, */*",
+}
+
+# Size chart browser (same profile directory SizeChartScraper uses)
+# Size chart pages open at once in the shared context (SIZE_CHART_CONCURRENCY in .env to tune)
+SIZE_CHART_CONCURRENCY = max(1, int(os.getenv("SIZE_CHART_CONCURRENCY", 6)))
+SIZE_CHART_INIT_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined
+    });
+"""
+# Shopify .js requests in flight at once; batches are grouped by host, so this is effectively per shop
+SHOPIFY_FETCH_CONCURRENCY = 16
+# Built once: loading the CA bundle costs tens of ms per context, and one context lets TLS sessions resume
+SSL_CONTEXT = ssl.create_default_context()
+SSL_CONTEXT.set_alpn_protocols(["h2", "http/1.1"])
+# Per-host token bucket for .js requests; a 429/503 halves that host's rate and retries with backoff
+SHOPIFY_HOST_RATE = 10.0  # requests per second
+SHOPIFY_MIN_HOST_RATE = 0.5
+SHOPIFY_RETRY_STATUSES = {429, 503}
+SHOPIFY_MAX_RETRIES = 3
+# Successful .js fetches kept per run, keyed by (host, path), so duplicate/variant rows reuse them
+SHOPIFY_CACHE_SIZE = 4096
+# Returned in place of product data when a conditional .js request gets 304 Not Modified
+NOT_MODIFIED = object()
+# Images and stylesheets are deliberately not blocked: chart extraction scores images by naturalWidth
+# and checks computed visibility, so both must load
+SIZE_CHART_BLOCKED_TYPES = {"font", "media", "texttrack", "eventsource", "manifest"}
+SIZE_CHART_BLOCKED_HOSTS = re.compile(
+    r"google-analytics|googletagmanager|googleadservices|googlesyndication|doubleclick|facebook\.net"
+    r"|connect\.facebook|hotjar|clarity\.ms|bat\.bing|analytics\.tiktok|ct\.pinterest|sc-static\.net"
+    r"|snap\.licdn|criteo|adsrvr|taboola|outbrain|segment\.(io|com)|fullstory|mouseflow|luckyorange"
+)
+# Product form or size-guide trigger: the page is far enough along to detect/click
+SIZE_CHART_READY_SELECTOR = "form[action*='/cart/add'], [class*='size-chart'], [class*='size-guide'], [class*='sizechart'], .sizelink"
+# Anything a size-guide click typically opens
+SIZE_CHART_POPUP_SELECTOR = "[role='dialog'], .modal.show, .modal.in, .mfp-content, .pswp--open"
+SIZE_CHART_USER_DATA_DIR = os.path.abspath("./user_data")
+SIZE_CHART_BROWSER_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-infobars",
+    "--window-position=0,0",
+    "--ignore-certificate-errors",
+    "--ignore-certificate-errors-spki-list",
+    "--user-agent=" + SHOPIFY_HEADERS["User-Agent"],
+]
+
+# Top-level .js product keys build_update_row reads; everything else is dropped at parse time
+SHOPIFY_FIELDS = ("title", "description", "price", "compare_at_price", "available", "variants", "options", "images")
 
 # Database configuration
 DB_CONFIG = {
@@ -87,6 +180,40 @@ DB_CONFIG = {
 }
 
 
+def read_json_file(path):
+    """Parse a JSON file (orjson when available)"""
+    with open(path, "rb") as f:
+        return json_loads(f.read())
+
+
+def write_json_file(path, data):
+    """
+    Write data to a JSON file with 2-space indent (orjson when available).
+    Goes through a temp file + os.replace so a crash never leaves a torn file.
+    """
+    tmp_path = path + ".tmp"
+    if orjson is None:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    else:
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, path)
+
+
+if orjson is not None:
+    class FastJson(Json):
+        """psycopg2 Json adapter that serializes with orjson"""
+        def dumps(self, obj):
+            return orjson.dumps(obj).decode("utf-8")
+else:
+    FastJson = Json
+
+
+# Product titles are cut to this many characters in log lines and the progress bar
+SHORT_TITLE_LEN = 45
+
+
 def log(msg, pbar=None):
     """Print a log message, using tqdm.write if a progress bar is active."""
     if pbar is not None:
@@ -99,8 +226,7 @@ def load_progress():
     """Load progress from progress.json"""
     if os.path.exists(PROGRESS_FILE):
         try:
-            with open(PROGRESS_FILE, "r") as f:
-                return json.load(f)
+            return read_json_file(PROGRESS_FILE)
         except Exception:
             pass
     return {
@@ -113,275 +239,862 @@ def load_progress():
     }
 
 
-def save_progress(progress):
-    """Save progress to progress.json"""
+def save_progress(progress, force=True):
+    """
+    Save progress to progress.json, only if the counters moved since the last save.
+    With force=False the write is also skipped if the last one was under
+    PROGRESS_SAVE_INTERVAL seconds ago.
+    """
+    global _last_progress_save, _last_saved_state
+    state = (progress["last_processed_id"], progress["total_processed"],
+             progress["total_updated"], progress["total_errors"])
+    if state == _last_saved_state:
+        return  # nothing changed since the last write
+    now = time.monotonic()
+    if not force and now - _last_progress_save < PROGRESS_SAVE_INTERVAL:
+        return
+    _last_progress_save = now
+    _last_saved_state = state
     progress["last_updated_at"] = datetime.now().isoformat()
-    with open(PROGRESS_FILE, "w") as f:
-        json.dump(progress, f, indent=2)
+    write_json_file(PROGRESS_FILE, progress)
 
 
-def load_errors():
-    """Load existing errors from error.json"""
-    if os.path.exists(ERROR_FILE):
+def load_domain_cache():
+    """Load per-host facts ({host: {"shopify": bool, "checked_at": ts}}) learned by earlier runs"""
+    if os.path.exists(DOMAIN_CACHE_FILE):
         try:
-            with open(ERROR_FILE, "r") as f:
-                return json.load(f)
+            return read_json_file(DOMAIN_CACHE_FILE)
         except Exception:
             pass
-    return {"errors": []}
+    return {}
+
+
+def save_domain_cache(domain_cache):
+    """Save per-host facts to domain_cache.json"""
+    write_json_file(DOMAIN_CACHE_FILE, domain_cache)
+
+
+def known_not_shopify(domain_cache: dict, host: str) -> bool:
+    """True while the host's cached "not a Shopify store" verdict is within NOT_SHOPIFY_TTL"""
+    entry = domain_cache.get(host) or {}
+    return entry.get("shopify") is False and time.time() - entry.get("checked_at", 0) < NOT_SHOPIFY_TTL
+
+
+def is_definitive_json_failure(error) -> bool:
+    """A .js failure that says something about the host: a 404 or a non-JSON body, not a timeout/429/5xx"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 404
+    return isinstance(error, ValueError)
+
+
+async def probe_shopify(client: httpx.AsyncClient, host: str):
+    """
+    Check whether a host is a Shopify store via its /products.json listing.
+    Returns True/False, or None when the probe itself failed and nothing can be concluded.
+    """
+    try:
+        response = await client.get(f"https://{host}/products.json", params={"limit": 1}, timeout=15)
+    except httpx.HTTPError:
+        return None
+    if "x-shopid" in response.headers or "x-shopify-stage" in response.headers:
+        return True
+    if response.status_code in SHOPIFY_RETRY_STATUSES or response.status_code >= 500:
+        return None
+    if response.status_code != 200:
+        return False
+    try:
+        return isinstance(json_loads(response.content).get("products"), list)
+    except (ValueError, AttributeError):
+        return False
+
+
+def url_host(url: str) -> str:
+    """Lower-cased host of a product URL; the key for per-domain caches and grouping"""
+    return urlparse(url).netloc.lower()
+
+
+def dumps_line(entry) -> bytes:
+    """One JSON object per line, UTF-8 encoded"""
+    if orjson is not None:
+        return orjson.dumps(entry) + b"\n"
+    return (json.dumps(entry) + "\n").encode("utf-8")
+
+
+def load_errors():
+    """Load all logged errors from error.ndjson"""
+    errors = []
+    if os.path.exists(ERROR_LOG_FILE):
+        with open(ERROR_LOG_FILE, "rb") as f:
+            for line in f:
+                try:
+                    errors.append(json_loads(line))
+                except ValueError:
+                    pass  # torn last line from a crash
+    return {"errors": errors}
+
+
+def open_error_log():
+    """
+    Open error.ndjson for appending. On first run the entries of an older
+    error.json are carried over so the log stays complete.
+    """
+    global _error_log
+    if _error_log is not None:
+        return
+    migrate = not os.path.exists(ERROR_LOG_FILE) and os.path.exists(ERROR_FILE)
+    # Unbuffered: each entry is a single write() straight to the file
+    _error_log = open(ERROR_LOG_FILE, "ab", buffering=0)
+    if migrate:
+        try:
+            legacy = read_json_file(ERROR_FILE).get("errors", [])
+        except Exception:
+            legacy = []
+        _error_log.write(b"".join(dumps_line(entry) for entry in legacy))
+
+
+def close_error_log():
+    """Close error.ndjson and rebuild the consolidated error.json view from it"""
+    global _error_log
+    if _error_log is None:
+        return
+    _error_log.close()
+    _error_log = None
+    export_errors()
+
+
+def export_errors():
+    """Rebuild error.json ({"errors": [...]}) from error.ndjson for tools that read the old format"""
+    write_json_file(ERROR_FILE, load_errors())
 
 
 def save_error(product_id, brand_url, error_message, error_type="fetch"):
-    """Append error to error.json"""
-    errors = load_errors()
-    errors["errors"].append({
+    """Append error to error.ndjson"""
+    open_error_log()
+    _error_log.write(dumps_line({
         "product_id": product_id,
         "brand_url": brand_url,
         "error": str(error_message),
         "type": error_type,
         "timestamp": datetime.now().isoformat()
-    })
-    with open(ERROR_FILE, "w") as f:
-        json.dump(errors, f, indent=2)
+    }))
+
+
+def get_db_connection(readonly=False):
+    """
+    Create database connection (plain tuple rows; see iter_products_to_update for the column order).
+    readonly=True gives an autocommit read-only session for the product scan and counts,
+    so reads never wait on the writer connection's transactions.
+    """
+    conn = psycopg2.connect(**DB_CONFIG)
+    if readonly:
+        conn.set_session(readonly=True, autocommit=True)
+    return conn
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Shared client for Shopify JSON fetches: pooled keep-alive connections over
+    the module's SSL_CONTEXT, HTTP/2 only when the optional h2 package is installed.
+    The transport retries failed connection attempts twice.
+    """
+    transport = httpx.AsyncHTTPTransport(
+        verify=SSL_CONTEXT,
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        retries=2,
+    )
+    return httpx.AsyncClient(
+        headers=SHOPIFY_HEADERS,
+        transport=transport,
+        timeout=30,
+        follow_redirects=True,
+    )
+
+
+class HostRateLimiter:
+    """
+    Token bucket per host. Requests only wait when a host is actually near
+    its rate; throttle() halves a host's rate after a 429/503 and each
+    successful request lets it creep back up to the configured ceiling.
+    """
+
+    def __init__(self, rate: float = SHOPIFY_HOST_RATE, min_rate: float = SHOPIFY_MIN_HOST_RATE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self._buckets = {}  # host -> [tokens, last refill time, current rate]
+
+    def _bucket(self, host: str) -> list:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = [self.rate, time.monotonic(), self.rate]
+        return bucket
+
+    async def acquire(self, host: str):
+        bucket = self._bucket(host)
+        while True:
+            now = time.monotonic()
+            bucket[0] = min(bucket[2], bucket[0] + (now - bucket[1]) * bucket[2])
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return
+            await asyncio.sleep((1 - bucket[0]) / bucket[2])
+
+    def throttle(self, host: str):
+        bucket = self._bucket(host)
+        bucket[2] = max(self.min_rate, bucket[2] / 2)
+        bucket[0] = min(bucket[0], 0.0)
+
+    def recover(self, host: str):
+        bucket = self._bucket(host)
+        if bucket[2] < self.rate:
+            bucket[2] = min(self.rate, bucket[2] * 1.1)
 
 
-def get_db_connection():
-    """Create database connection"""
-    return psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+def retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a 429/503: Retry-After when given, else exponential"""
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.isdigit():
+        return min(float(retry_after), 60.0)
+    return 2.0 ** attempt
 
 
-def fetch_shopify_json(brand_url: str, timeout: int = 30) -> dict:
+async def fetch_shopify_json(client: httpx.AsyncClient, brand_url: str, timeout: int = 30,
+                             semaphore: asyncio.Semaphore = None,
+                             limiter: HostRateLimiter = None,
+                             validators: tuple = None) -> tuple:
     """
     Fetch product data from Shopify JSON endpoint.
     Appends .js to the brand_url to get JSON response.
+    Returns (True, data, validators), or (False, error, None) for HTTP/network/parse
+    failures so callers can fall back without exception handling.
+    `validators` is the stored (etag, last_modified) pair; when given the request
+    is conditional and a 304 returns NOT_MODIFIED as data. The response's own
+    (etag, last_modified) pair is returned for storing with the update.
+    `semaphore` caps how many requests are in flight at once; `limiter`
+    paces requests per host and backs off on 429/503.
     """
     json_url = brand_url.rstrip("/") + ".js"
+    host = url_host(brand_url)
+    headers = {}
+    if validators:
+        etag, last_modified = validators
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
     
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
-        "Accept": "application/json, text/plain, */*",
-    }
-    
-    with httpx.Client(timeout=timeout, follow_redirects=True, verify=False) as client:
-        response = client.get(json_url, headers=headers)
+    try:
+        for attempt in range(SHOPIFY_MAX_RETRIES + 1):
+            if limiter is not None:
+                await limiter.acquire(host)
+            if semaphore is None:
+                response = await client.get(json_url, headers=headers, timeout=timeout)
+            else:
+                async with semaphore:
+                    response = await client.get(json_url, headers=headers, timeout=timeout)
+            if response.status_code not in SHOPIFY_RETRY_STATUSES or attempt == SHOPIFY_MAX_RETRIES:
+                break
+            if limiter is not None:
+                limiter.throttle(host)
+            await asyncio.sleep(retry_delay(response, attempt))
+        if response.status_code == 304:
+            if limiter is not None:
+                limiter.recover(host)
+            return True, NOT_MODIFIED, validators
         response.raise_for_status()
-        return response.json()
+        if limiter is not None:
+            limiter.recover(host)
+        new_validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return True, parse_shopify_product(response.content), new_validators
+    except (httpx.HTTPError, ValueError) as e:
+        return False, e, None
+
+
+class ShopifyFetchCache:
+    """
+    LRU of fetch_shopify_json tasks keyed by (host, path), ignoring query and
+    fragment so ?variant= rows share one request, plus the stored validators
+    so a 304 is only shared between rows that sent the same ones. In-flight
+    tasks are shared too; finished ones are only reused when they succeeded,
+    so failures and 404s are always fetched fresh.
+    """
+
+    def __init__(self, maxsize: int = SHOPIFY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._tasks = OrderedDict()
+
+    def fetch(self, client: httpx.AsyncClient, brand_url: str, **kwargs) -> asyncio.Task:
+        parts = urlparse(brand_url)
+        key = (parts.netloc.lower(), parts.path.rstrip("/"), kwargs.get("validators"))
+        task = self._tasks.get(key)
+        if task is not None:
+            if not task.done():
+                self._tasks.move_to_end(key)
+                return task
+            # result() would re-raise an unexpected exception (e.g. httpx.InvalidURL) right here,
+            # outside any per-product handler, so check it first; failed tasks are dropped
+            if not task.cancelled() and task.exception() is None and task.result()[0]:
+                self._tasks.move_to_end(key)
+                return task
+            del self._tasks[key]
+        task = self._tasks[key] = asyncio.create_task(fetch_shopify_json(client, brand_url, **kwargs))
+        self._tasks.move_to_end(key)
+        if len(self._tasks) > self.maxsize:
+            self._tasks.popitem(last=False)
+        return task
 
 
-def convert_price(price_in_paisa) -> float:
-    """Convert price from paisa (integer) to rupees (decimal)"""
+async def skip_shopify_json(brand_url: str) -> tuple:
+    """Stand-in for fetch_shopify_json on hosts already known not to be Shopify stores"""
+    return False, ValueError(f"{url_host(brand_url)} has no Shopify .js endpoint (cached)"), None
+
+
+def parse_shopify_product(content: bytes):
+    """Decode a .js product response, keeping only SHOPIFY_FIELDS"""
+    if simdjson is not None:
+        # The parser reuses its buffer, so copy out what we need before the next parse
+        doc = _simdjson_parser.parse(content)
+        if not isinstance(doc, simdjson.Object):
+            return doc.as_list() if isinstance(doc, simdjson.Array) else doc
+        product = {}
+        for key in SHOPIFY_FIELDS:
+            if key in doc:
+                value = doc[key]
+                if isinstance(value, simdjson.Array):
+                    value = value.as_list()
+                elif isinstance(value, simdjson.Object):
+                    value = value.as_dict()
+                product[key] = value
+    else:
+        data = json_loads(content)
+        if not isinstance(data, dict):
+            return data
+        product = {key: data[key] for key in SHOPIFY_FIELDS if key in data}
+    if "images" in product:
+        product["images"] = normalize_image_urls(product["images"])
+    return product
+
+
+def normalize_image_urls(images) -> list:
+    """Keep string URLs only, upgrading protocol-relative ones to https"""
+    if not isinstance(images, list):
+        return []
+    return ["https:" + img if img.startswith("//") else img for img in images if isinstance(img, str)]
+
+
+def convert_price(price_in_paisa):
+    """
+    Convert price from paisa (integer) to rupees (decimal).
+    Shopify .js always sends integer paise, which are shifted exactly into a
+    Decimal for the NUMERIC columns; anything else takes the float path.
+    """
     if price_in_paisa is None:
         return None
+    if type(price_in_paisa) is int:
+        return Decimal(price_in_paisa).scaleb(-2)
     return float(price_in_paisa) / 100.0
 
 
-def table_to_html(table_data: list) -> str:
-    """Convert table data (list of rows) to HTML table"""
-    if not table_data or len(table_data) == 0:
-        return ""
-    
-    html = '<table class="size-chart-table">\n'
-    
-    # First row as header
-    html += "  <thead>\n    <tr>\n"
-    for cell in table_data[0]:
-        html += f"      <th>{cell}</th>\n"
-    html += "    </tr>\n  </thead>\n"
-    
-    # Rest as body
-    if len(table_data) > 1:
-        html += "  <tbody>\n"
-        for row in table_data[1:]:
-            html += "    <tr>\n"
-            for cell in row:
-                html += f"      <td>{cell}</td>\n"
-            html += "    </tr>\n"
-        html += "  </tbody>\n"
-    
-    html += "</table>"
-    return html
+def convert_prices(shopify_data: dict) -> tuple:
+    """(price_discounted, price_original) in rupees from a Shopify product"""
+    return convert_price(shopify_data.get("price")), convert_price(shopify_data.get("compare_at_price"))
 
 
-def images_to_html(images: list) -> str:
-    """Convert image URLs to HTML img tags"""
-    if not images:
-        return ""
-    
-    html = '<div class="size-chart-images">\n'
-    for img_url in images:
-        if img_url.startswith("//"):
-            img_url = "https:" + img_url
-        html += f'  <img src="{img_url}" alt="Size Chart" loading="lazy" />\n'
-    html += '</div>'
-    return html
-
-
-def result_to_html(result: dict) -> str:
-    """Convert scraper result to full HTML"""
-    parts = []
-    
-    if result.get("table"):
-        parts.append(table_to_html(result["table"]))
-    
-    if result.get("images"):
-        parts.append(images_to_html(result["images"]))
-    
-    if result.get("textHtml"):
-        text_html = result["textHtml"]
-        parts.append(f'<div class="size-chart-text">\n{text_html}\n</div>')
-    
-    if not parts:
+class SizeTableParser(HTMLParser):
+    """Collects the rows of each top-level <table> in a description along with its class"""
+
+    def __init__(self):
+        super().__init__()
+        self.tables = []  # [(class_attr, rows)]
+        self.depth = 0
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.depth += 1
+            if self.depth == 1:
+                self.tables.append((dict(attrs).get("class") or "", []))
+        elif self.depth == 1:
+            if tag == "tr":
+                self.row = []
+            elif tag in ("td", "th") and self.row is not None:
+                self.cell = []
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            self.depth = max(self.depth - 1, 0)
+        elif self.depth == 1:
+            if tag in ("td", "th") and self.cell is not None:
+                self.row.append(" ".join("".join(self.cell).split()))
+                self.cell = None
+            elif tag == "tr" and self.row is not None:
+                if self.row:
+                    self.tables[-1][1].append(self.row)
+                self.row = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+
+def extract_size_chart_from_html(body_html: str) -> str:
+    """
+    Size chart HTML from a table embedded in the product description, in the
+    same format scrape_size_chart produces. Returns None if there isn't one.
+    """
+    if not body_html or "<table" not in body_html.lower():
+        return None
+    parser = SizeTableParser()
+    try:
+        parser.feed(body_html)
+        parser.close()
+    except Exception:
+        return None
+    for table_class, rows in parser.tables:
+        if len(rows) < 2:
+            continue
+        if "size" in table_class.lower() or any("size" in cell.lower() for cell in rows[0]):
+            return render_size_chart({"table": rows})
+    return None
+
+
+def render_size_chart(result: dict) -> str:
+    """
+    Render a scraper result as the stored size chart HTML in one pass: an
+    escaped table, escaped image URLs and the page's own text HTML as-is,
+    inside a <div class="size-chart">. Returns None when there is nothing to show.
+    The markup must stay byte-stable, since it feeds content_hash.
+    """
+    table = result.get("table")
+    images = result.get("images")
+    text_html = result.get("textHtml")
+    if not (table or images or text_html):
         return None
     
-    return '<div class="size-chart">\n' + "\n".join(parts) + '\n</div>'
+    parts = ['<div class="size-chart">\n']
+    if table:
+        # First row as header, the rest as body
+        parts.append('<table class="size-chart-table">\n  <thead>\n    <tr>\n')
+        parts.extend(f"      <th>{escape(str(cell))}</th>\n" for cell in table[0])
+        parts.append("    </tr>\n  </thead>\n")
+        if len(table) > 1:
+            parts.append("  <tbody>\n")
+            for row in table[1:]:
+                parts.append("    <tr>\n")
+                parts.extend(f"      <td>{escape(str(cell))}</td>\n" for cell in row)
+                parts.append("    </tr>\n")
+            parts.append("  </tbody>\n")
+        parts.append("</table>\n")
+    if images:
+        parts.append('<div class="size-chart-images">\n')
+        for img_url in images:
+            if img_url.startswith("//"):
+                img_url = "https:" + img_url
+            parts.append(f'  <img src="{escape(img_url)}" alt="Size Chart" loading="lazy" />\n')
+        parts.append("</div>\n")
+    if text_html:
+        parts.append(f'<div class="size-chart-text">\n{text_html}\n</div>\n')
+    parts.append("</div>")
+    return "".join(parts)
 
 
-async def scrape_size_chart(brand_url: str) -> str:
+async def launch_size_chart_context(playwright):
+    """Launch the persistent browser context shared by all size chart scrapes"""
+    context = await playwright.chromium.launch_persistent_context(
+        SIZE_CHART_USER_DATA_DIR,
+        headless=True,
+        args=SIZE_CHART_BROWSER_ARGS,
+        viewport={"width": 1280, "height": 800},
+        user_agent=SHOPIFY_HEADERS["User-Agent"]
+    )
+    await context.add_init_script(SIZE_CHART_INIT_SCRIPT)
+    await context.add_init_script(PAGE_SCRIPTS_INIT)
+    await context.route("**/*", block_size_chart_extras)
+    return context
+
+
+async def block_size_chart_extras(route):
+    """Abort fonts, media and trackers; images and CSS stay since chart extraction reads them"""
+    request = route.request
+    if request.resource_type in SIZE_CHART_BLOCKED_TYPES or SIZE_CHART_BLOCKED_HOSTS.search(request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def wait_for_selector_or_timeout(page, selector: str, timeout: int, state: str = "attached"):
+    """Wait until `selector` matches, giving up silently after `timeout` ms"""
+    try:
+        await page.wait_for_selector(selector, state=state, timeout=timeout)
+    except Exception:
+        pass
+
+
+async def scrape_size_chart(context, brand_url: str, brand_cache: dict, on_cache_change=None) -> str:
     """
     Scrape size chart from product page and return as HTML.
+    Opens a fresh page on the shared context; detected chart types are
+    remembered in brand_cache for the rest of the run, and `on_cache_change`
+    is called whenever this scrape added or removed a brand_cache entry.
     Returns None if no size chart found.
     """
+    page = None
+    scraper = None
     try:
-        scraper = SizeChartScraper(brand_url, headless=True)
+        scraper = SizeChartScraper(brand_url, headless=True, brand_cache=brand_cache)
+        if scraper.known_without_chart():
+            return None
+        page = await context.new_page()
         
-        async with __import__('playwright.async_api', fromlist=['async_playwright']).async_playwright() as p:
-            args = [
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-setuid-sandbox",
-                "--disable-infobars",
-                "--window-position=0,0",
-                "--ignore-certificate-errors",
-                "--ignore-certificate-errors-spki-list",
-                "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-            ]
-            
-            context = await p.chromium.launch_persistent_context(
-                scraper.user_data_dir,
-                headless=True,
-                args=args,
-                viewport={"width": 1280, "height": 800},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-            )
-            
-            page = context.pages[0] if context.pages else await context.new_page()
-            
-            await page.add_init_script("""
-                Object.defineProperty(navigator, 'webdriver', {
-                    get: () => undefined
-                });
-            """)
-            
+        try:
+            await page.goto(brand_url, wait_until="commit", timeout=60000)
+            await wait_for_selector_or_timeout(page, SIZE_CHART_READY_SELECTOR, 5000)
+            await page.wait_for_load_state("domcontentloaded", timeout=60000)
+        except Exception:
+            pass
+        
+        # Detect type
+        if scraper.domain in brand_cache:
+            touch_brand(brand_cache, scraper.domain)
+            scraper.detected_type = brand_cache[scraper.domain]['type']
+        else:
+            detection = await scraper.detect_size_chart_type(page)
+            brand_cache[scraper.domain] = {
+                'type': scraper.detected_type,
+                'confidence': detection['primaryType'].get('confidence', 0),
+                'selector': detection['primaryType'].get('selector', None)
+            }
+            scraper.brand_cache_dirty = True
+        
+        # Interact with triggers
+        await scraper.interact_with_triggers(page)
+        await wait_for_selector_or_timeout(page, SIZE_CHART_POPUP_SELECTOR, 2000, state="visible")
+        
+        # Extract content
+        result = await scraper.extract_content(page)
+        
+        return render_size_chart(result)
+        
+    except Exception:
+        return None
+    finally:
+        if scraper is not None and scraper.brand_cache_dirty and on_cache_change is not None:
+            on_cache_change()
+        if page is not None:
             try:
-                await page.goto(brand_url, wait_until="domcontentloaded", timeout=60000)
+                await page.close()
             except Exception:
                 pass
-            
-            await page.wait_for_timeout(2000)
-            
-            # Detect type
-            if scraper.domain in scraper.brand_cache:
-                scraper.detected_type = scraper.brand_cache[scraper.domain]['type']
-            else:
-                await scraper.detect_size_chart_type(page)
-            
-            # Interact with triggers
-            await scraper.interact_with_triggers(page)
-            await page.wait_for_timeout(2000)
-            
-            # Extract content
-            result = await scraper.extract_content(page)
-            
-            await context.close()
-            
-            return result_to_html(result)
-            
-    except Exception:
-        return None
 
 
-def update_product(conn, product_id: int, shopify_data: dict, size_chart_html: str = None):
-    """Update product in database with new data"""
+def start_size_chart_tasks(context, products, brand_cache, semaphore, fetch_tasks, no_embedded_chart,
+                           on_cache_change=None) -> dict:
+    """
+    Start size chart lookups for every apparel product in the batch so they
+    overlap the Shopify JSON fetches. Each first checks the product's own
+    description for a size table and only opens a browser page (at most
+    `semaphore` at a time) when there isn't one. Hosts whose descriptions
+    had no table are added to `no_embedded_chart` and skip that check.
+    Returns {product_id: task}.
+    """
+    async def lookup(product_id, brand_url):
+        try:
+            ok, shopify_data, _ = await asyncio.shield(fetch_tasks[product_id])
+        except Exception:
+            ok = False
+        if not (ok and isinstance(shopify_data, dict)):
+            return None  # 304 or failed fetch: no browser lookup for products the .js fetch did not return
+        host = url_host(brand_url)
+        if host not in no_embedded_chart:
+            size_chart_html = extract_size_chart_from_html(shopify_data.get("description"))
+            if size_chart_html:
+                return size_chart_html
+            no_embedded_chart.add(host)
+        async with semaphore:
+            return await scrape_size_chart(context, brand_url, brand_cache, on_cache_change)
+
+    if context is None:
+        return {}
+    return {
+        product_id: asyncio.create_task(lookup(product_id, brand_url))
+        for product_id, brand_url, category, *_ in products
+        if category == "apparel"
+    }
+
+
+async def cancel_tasks(tasks: dict):
+    """Cancel and reap tasks nobody awaited (e.g. products that failed to fetch)"""
+    for task in tasks.values():
+        task.cancel()
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+    tasks.clear()
+
+
+# Batched UPDATE shared by both flush paths: rows are joined in as `v`.
+# NULL means "keep the current value"; an empty size_chart clears it.
+UPDATE_SET_CLAUSE = """
+    UPDATE scraped_products AS p SET
+        title = COALESCE(v.title, p.title),
+        description = COALESCE(v.description, p.description),
+        price_discounted = COALESCE(v.price_discounted, p.price_discounted),
+        price_original = COALESCE(v.price_original, p.price_original),
+        is_available = v.is_available,
+        variants = COALESCE(v.variants, p.variants),
+        options = COALESCE(v.options, p.options),
+        images = COALESCE(v.images, p.images),
+        size_chart = CASE WHEN v.size_chart IS NULL THEN p.size_chart ELSE NULLIF(v.size_chart, '') END,
+        content_hash = v.content_hash,
+        shopify_etag = v.shopify_etag,
+        shopify_last_modified = v.shopify_last_modified
+"""
+BATCH_UPDATE_QUERY = UPDATE_SET_CLAUSE + """
+    FROM (VALUES %s) AS v(id, title, description, price_discounted, price_original,
+                          is_available, variants, options, images, size_chart, content_hash,
+                          shopify_etag, shopify_last_modified)
+    WHERE p.id = v.id
+"""
+BATCH_UPDATE_TEMPLATE = ("(%s::bigint, %s::text, %s::text, %s::numeric, %s::numeric, %s::boolean, %s::jsonb, %s::jsonb,"
+                         " %s::text[], %s::text, %s::bytea, %s::text, %s::text)")
+
+# Large flushes are streamed with COPY into a staging table instead of a VALUES list
+COPY_MIN_ROWS = 200
+STAGE_TABLE_QUERY = """
+    CREATE TEMP TABLE stage_upd (
+        id bigint, title text, description text, price_discounted numeric, price_original numeric,
+        is_available boolean, variants jsonb, options jsonb, images text[], size_chart text, content_hash bytea,
+        shopify_etag text, shopify_last_modified text
+    ) ON COMMIT DROP
+"""
+STAGE_UPDATE_QUERY = UPDATE_SET_CLAUSE + """
+    FROM stage_upd AS v
+    WHERE p.id = v.id
+"""
+
+
+# Same update for a single row, prepared once per connection (see prepare_statements)
+PREPARE_UPDATE_QUERY = """
+    PREPARE upd_prod(bigint, text, text, numeric, numeric, boolean, jsonb, jsonb, text[], text, bytea, text, text) AS
+    UPDATE scraped_products SET
+        title = COALESCE($2, title),
+        description = COALESCE($3, description),
+        price_discounted = COALESCE($4, price_discounted),
+        price_original = COALESCE($5, price_original),
+        is_available = $6,
+        variants = COALESCE($7, variants),
+        options = COALESCE($8, options),
+        images = COALESCE($9, images),
+        size_chart = CASE WHEN $10 IS NULL THEN size_chart ELSE NULLIF($10, '') END,
+        content_hash = $11,
+        shopify_etag = $12,
+        shopify_last_modified = $13
+    WHERE id = $1
+"""
+
+
+# Partial covering index matching iter_products_to_update's predicate and columns, so the
+# id-ordered scan is an index-only scan instead of a PK walk with a heap check per row
+UPDATER_INDEX_QUERY = """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS scraped_products_updater_idx
+    ON scraped_products (id)
+    INCLUDE (brand_url, category, title, content_hash, shopify_etag, shopify_last_modified)
+    WHERE brand_url IS NOT NULL AND brand_url <> ''
+"""
+
+
+# Columns the updater adds to an older scraped_products table, with their types
+UPDATER_COLUMNS = {
+    "content_hash": "bytea",
+    "shopify_etag": "text",
+    "shopify_last_modified": "text",
+}
+
+
+def ensure_schema(conn):
+    """Add the columns the updater relies on if an older table lacks them, and check its index"""
+    # ALTER TABLE takes an ACCESS EXCLUSIVE lock even when every column exists, so look first
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'scraped_products'
+              AND column_name = ANY(%s)
+        """, (list(UPDATER_COLUMNS),))
+        existing = {name for (name,) in cur.fetchall()}
+        missing = [name for name in UPDATER_COLUMNS if name not in existing]
+        if missing:
+            cur.execute(
+                "ALTER TABLE scraped_products "
+                + ", ".join(f"ADD COLUMN IF NOT EXISTS {name} {UPDATER_COLUMNS[name]}" for name in missing)
+            )
+    conn.commit()
+    
+    check_updater_index(conn)
+
+
+def updater_index_state(conn):
+    """None if scraped_products_updater_idx doesn't exist, else whether it is valid"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT i.indisvalid FROM pg_index i
+            WHERE i.indexrelid = to_regclass('scraped_products_updater_idx')
+        """)
+        row = cur.fetchone()
+    conn.commit()
+    return row[0] if row is not None else None
+
+
+def check_updater_index(conn):
+    """Warn when the scan index is missing or INVALID; the updater still works without it, only slower"""
+    state = updater_index_state(conn)
+    if state is None:
+        print("⚠ scraped_products_updater_idx is missing, run `python product_updater.py --create-index` to build it")
+    elif not state:
+        print("⚠ scraped_products_updater_idx is INVALID, run `python product_updater.py --create-index` to rebuild it")
+
+
+def create_updater_index():
+    """
+    Build scraped_products_updater_idx (--create-index). A concurrent build that was
+    interrupted leaves an INVALID index behind, which is dropped and rebuilt.
+    """
+    conn = get_db_connection()
+    try:
+        state = updater_index_state(conn)
+        if state:
+            print("✔ scraped_products_updater_idx already exists")
+            return
+        # CONCURRENTLY can't run inside a transaction block
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            if state is not None:
+                cur.execute("DROP INDEX CONCURRENTLY IF EXISTS scraped_products_updater_idx")
+            cur.execute(UPDATER_INDEX_QUERY)
+        print("✔ Built scraped_products_updater_idx")
+    finally:
+        conn.close()
+
+
+def content_hash(shopify_data: dict, size_chart_html: str = None) -> bytes:
+    """Digest of everything an update would write, to skip rows whose data hasn't changed"""
+    payload = [shopify_data, size_chart_html]
+    if orjson is not None:
+        encoded = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    else:
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+def prepare_statements(conn):
+    """Prepare the per-row UPDATE on this connection so fallbacks skip parse/plan"""
+    with conn.cursor() as cur:
+        cur.execute(PREPARE_UPDATE_QUERY)
+    conn.commit()
+
+
+def update_product_row(conn, row: tuple):
+    """Write a single build_update_row() row with the prepared statement and commit"""
+    with conn.cursor() as cur:
+        cur.execute("EXECUTE upd_prod (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", row)
+    conn.commit()
+
+
+def build_update_row(product_id: int, shopify_data: dict, size_chart_html: str = None, data_hash: bytes = None,
+                     validators: tuple = None) -> tuple:
+    """Map Shopify data (and the response's (etag, last_modified), if any) to a row for BATCH_UPDATE_QUERY"""
     
     # Map fields
     title = shopify_data.get("title")
     description = shopify_data.get("description")
-    price_discounted = convert_price(shopify_data.get("price"))
-    price_original = convert_price(shopify_data.get("compare_at_price"))
+    price_discounted, price_original = convert_prices(shopify_data)
     is_available = shopify_data.get("available", False)
     variants = shopify_data.get("variants", [])
     options = shopify_data.get("options", [])
-    images = shopify_data.get("images", [])
-    
-    # Clean up images - ensure https protocol
-    cleaned_images = []
-    for img in images:
-        if isinstance(img, str):
-            if img.startswith("//"):
-                img = "https:" + img
-            cleaned_images.append(img)
-    
-    # Build update query
-    update_fields = []
-    params = []
-    
-    if title:
-        update_fields.append("title = %s")
-        params.append(title)
-    
-    if description:
-        update_fields.append("description = %s")
-        params.append(description)
-    
-    if price_discounted is not None:
-        update_fields.append("price_discounted = %s")
-        params.append(price_discounted)
-    
-    if price_original is not None:
-        update_fields.append("price_original = %s")
-        params.append(price_original)
-    
-    update_fields.append("is_available = %s")
-    params.append(is_available)
-    
-    if variants:
-        update_fields.append("variants = %s")
-        params.append(Json(variants))
-    
-    if options:
-        update_fields.append("options = %s")
-        params.append(Json(options))
-    
-    if cleaned_images:
-        update_fields.append("images = %s")
-        params.append(cleaned_images)
-    
-    if size_chart_html:
-        update_fields.append("size_chart = %s")
-        params.append(size_chart_html)
-    elif size_chart_html == "":
-        update_fields.append("size_chart = NULL")
-    
-    params.append(product_id)
-    
-    query = f"""
-        UPDATE scraped_products
-        SET {', '.join(update_fields)}
-        WHERE id = %s
-    """
+    images = shopify_data.get("images")  # already normalized by parse_shopify_product
+    etag, last_modified = validators or (None, None)
     
+    return (
+        product_id,
+        title or None,
+        description or None,
+        price_discounted,
+        price_original,
+        is_available,
+        FastJson(variants) if variants else None,
+        FastJson(options) if options else None,
+        images or None,
+        size_chart_html,
+        data_hash,
+        etag,
+        last_modified,
+    )
+
+
+def _copy_field(value) -> str:
+    """Format one value for COPY ... FROM STDIN (text format)"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, memoryview)):
+        return "\\\\x" + bytes(value).hex()
+    if isinstance(value, Json):
+        text = value.dumps(value.adapted)
+    elif isinstance(value, list):
+        text = "{" + ",".join('"' + str(item).replace("\\", "\\\\").replace('"', '\\"') + '"' for item in value) + "}"
+    else:
+        text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_updates(cur, pending_updates: list):
+    """Stream rows into a transaction-scoped staging table and apply them with one UPDATE ... FROM"""
+    buf = io.StringIO("".join("\t".join(map(_copy_field, row)) + "\n" for row in pending_updates))
+    cur.execute(STAGE_TABLE_QUERY)
+    cur.copy_expert("COPY stage_upd FROM STDIN", buf)
+    cur.execute(STAGE_UPDATE_QUERY)
+
+
+def flush_updates(conn, pending_updates: list):
+    """Write all pending update rows in one statement and commit"""
+    if not pending_updates:
+        return
     with conn.cursor() as cur:
-        cur.execute(query, params)
+        if len(pending_updates) >= COPY_MIN_ROWS:
+            copy_updates(cur, pending_updates)
+        else:
+            # page_size covers every row below the COPY threshold: always a single statement
+            execute_values(cur, BATCH_UPDATE_QUERY, pending_updates, template=BATCH_UPDATE_TEMPLATE, page_size=COPY_MIN_ROWS)
     conn.commit()
 
 
-def get_products_to_update(conn, last_id: int = None, batch_size: int = 100, category_filter: str = None):
-    """Fetch batch of products to update, ordered by id"""
+def delete_products(conn, product_ids: list):
+    """Delete products whose pages are gone (404) in one statement and commit"""
+    if not product_ids:
+        return
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM scraped_products WHERE id = ANY(%s)", (product_ids,))
+    conn.commit()
+
+
+def iter_products_to_update(conn, last_id: int = None, batch_size: int = 100, category_filter: str = None,
+                            window_size: int = 500):
+    """
+    Yield (batch, done_id) pairs of products to update from a single
+    server-side cursor instead of re-querying with LIMIT per batch.
+    
+    Rows are read in id order, window_size at a time, and each window is
+    regrouped by host so consecutive batches hit the same shop (warm
+    keep-alive connections and browser cache). done_id is the window's
+    highest id on its last batch and None otherwise; only then is it safe
+    to record as last_processed_id.
+    """
     query = """
-        SELECT id, brand_url, category, title
+        SELECT id, brand_url, coalesce(lower(trim(category)), '') AS category, title, content_hash,
+               shopify_etag, shopify_last_modified
         FROM scraped_products
-        WHERE brand_url IS NOT NULL AND brand_url != ''
-    """
+        WHERE brand_url IS NOT NULL AND brand_url <> ''
+    """  # keep this predicate: it is what lets the planner use scraped_products_updater_idx
     params = []
     
     if category_filter:
@@ -392,52 +1105,51 @@ def get_products_to_update(conn, last_id: int = None, batch_size: int = 100, cat
         query += " AND id > %s"
         params.append(last_id)
     
-    query += " ORDER BY id ASC LIMIT %s"
-    params.append(batch_size)
+    query += " ORDER BY id ASC"
     
-    with conn.cursor() as cur:
+    # WITH HOLD is required for a named cursor on an autocommit connection;
+    # NO SCROLL since we only ever read forward (fetchmany sets the round-trip size)
+    with conn.cursor(name="product_iter", withhold=True, scrollable=False) as cur:
         cur.execute(query, params)
-        return cur.fetchall()
+        while True:
+            window = cur.fetchmany(window_size)
+            if not window:
+                return
+            done_id = window[-1][0]
+            window.sort(key=lambda row: url_host(row[1]))
+            for start in range(0, len(window), batch_size):
+                end = start + batch_size
+                yield window[start:end], (done_id if end >= len(window) else None)
 
 
-def get_total_count(conn, last_id: int = None, category_filter: str = None):
-    """Get total count of products remaining"""
-    query = """
-        SELECT COUNT(*) as count
-        FROM scraped_products
-        WHERE brand_url IS NOT NULL AND brand_url != ''
+def get_remaining_estimate(conn, last_id: int = None, category_filter: str = None) -> int:
+    """
+    Number of products left to update (all of them when last_id is None).
+    Without a category filter this is the planner's row estimate from
+    EXPLAIN, which has real column statistics for the brand_url/id
+    predicates and needs no table scan. lower(category) has no statistics,
+    so filtered runs keep an exact COUNT(*).
     """
+    where = "brand_url IS NOT NULL AND brand_url != ''"
     params = []
     
     if category_filter:
-        query += " AND lower(category) = lower(%s)"
+        where += " AND lower(category) = lower(%s)"
         params.append(category_filter)
     
     if last_id is not None:
-        query += " AND id > %s"
+        where += " AND id > %s"
         params.append(last_id)
     
     with conn.cursor() as cur:
-        cur.execute(query, params)
-        return cur.fetchone()["count"]
-
-
-def get_absolute_total(conn, category_filter: str = None):
-    """Get absolute total count of all products (for progress bar denominator)"""
-    query = """
-        SELECT COUNT(*) as count
-        FROM scraped_products
-        WHERE brand_url IS NOT NULL AND brand_url != ''
-    """
-    params = []
-    
-    if category_filter:
-        query += " AND lower(category) = lower(%s)"
-        params.append(category_filter)
-
-    with conn.cursor() as cur:
-        cur.execute(query, params)
-        return cur.fetchone()["count"]
+        if category_filter:
+            cur.execute(f"SELECT COUNT(*) FROM scraped_products WHERE {where}", params)
+            return cur.fetchone()[0]
+        cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM scraped_products WHERE {where}", params)
+        plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json_loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
 
 
 async def main():
@@ -455,19 +1167,26 @@ async def main():
     if progress["started_at"] is None:
         progress["started_at"] = datetime.now().isoformat()
     
+    # Last-resort flush for exits that bypass main's finally (e.g. a second Ctrl+C)
+    atexit.register(save_progress, progress)
+    
     last_id = progress.get("last_processed_id")
     
     # Connect to database
     try:
         conn = get_db_connection()
+        conn_read = get_db_connection(readonly=True)
     except Exception as e:
         print(f"✖ DB connection failed: {e}")
         return
     
+    ensure_schema(conn)
+    prepare_statements(conn)
+    
     # Get counts
-    total_all = get_absolute_total(conn, category_filter)
-    remaining = get_total_count(conn, last_id, category_filter)
+    total_all = get_remaining_estimate(conn_read, None, category_filter)
     already_done = progress["total_processed"]
+    remaining = get_remaining_estimate(conn_read, last_id, category_filter) if last_id else total_all
     
     # Header
     print()
@@ -489,6 +1208,45 @@ async def main():
     session_size_charts = 0
     session_no_size_charts = 0
     session_deleted = 0
+    session_unchanged = 0
+    pending_updates = []
+    pending_deletes = []
+    pending_urls = {}
+    window_processed = 0  # products seen in the current id window, counted once it is flushed
+    flush_task = None
+    
+    async def flush_window(updates, deletes, urls, done_id, processed):
+        """Write one id window's updates and deletes, then record it as the resume point"""
+        nonlocal session_updated, session_errors, session_deleted
+        try:
+            await asyncio.to_thread(flush_updates, conn, updates)
+        except Exception as e:
+            conn.rollback()
+            log(f"  ✖ Batch update failed, retrying per row: {str(e)[:60]}", pbar)
+            for row in updates:
+                try:
+                    await asyncio.to_thread(update_product_row, conn, row)
+                except Exception as row_e:
+                    conn.rollback()
+                    save_error(row[0], urls.get(row[0]), str(row_e), "db")
+                    session_updated -= 1
+                    progress["total_updated"] -= 1
+                    session_errors += 1
+                    progress["total_errors"] += 1
+        try:
+            await asyncio.to_thread(delete_products, conn, deletes)
+        except Exception as e:
+            conn.rollback()
+            log(f"  ✖ Delete failed: {str(e)[:60]}", pbar)
+            for product_id in deletes:
+                save_error(product_id, urls.get(product_id), str(e), "db")
+            session_deleted -= len(deletes)
+            session_errors += len(deletes)
+            progress["total_errors"] += len(deletes)
+        # Counted with the resume point, so a restart doesn't count the unflushed window twice
+        progress["last_processed_id"] = done_id
+        progress["total_processed"] += processed
+        await asyncio.to_thread(save_progress, progress, False)
     
     # Create progress bar: total = all products, initial = already done
     pbar = tqdm(
@@ -501,22 +1259,60 @@ async def main():
         dynamic_ncols=True,
     )
     
+    client = create_http_client()
+    fetch_sem = asyncio.Semaphore(SHOPIFY_FETCH_CONCURRENCY)
+    host_limiter = HostRateLimiter()
+    shopify_cache = ShopifyFetchCache()
+    batches = iter_products_to_update(conn_read, last_id, batch_size, category_filter)
+    
+    # One browser for every size chart in the run (skipped when no apparel can match)
+    playwright = size_chart_context = None
+    generic_pool = None  # fallback scraper's browser, started on the first non-Shopify product
+    brand_cache = get_brand_cache()
+    # Set by size chart scrapes that add a detection or drop a stale 'NONE' entry; a length check
+    # would miss a drop followed by a re-detection
+    brand_cache_dirty = False
+    
+    def mark_brand_cache_dirty():
+        nonlocal brand_cache_dirty
+        brand_cache_dirty = True
+    domain_cache = load_domain_cache()
+    domain_cache_dirty = False
+    size_chart_sem = asyncio.Semaphore(SIZE_CHART_CONCURRENCY)
+    chart_tasks = {}
+    no_embedded_chart = set()
+    if category_filter is None or category_filter.lower().strip() == "apparel":
+        playwright = await async_playwright().start()
+        size_chart_context = await launch_size_chart_context(playwright)
+    
     try:
-        while True:
-            products = get_products_to_update(conn, last_id, batch_size, category_filter)
+        # Blocking psycopg2/file calls run in worker threads so in-flight size chart pages keep going
+        while (item := await asyncio.to_thread(next, batches, None)) is not None:
+            products, window_done_id = item
             
-            if not products:
-                log("✔ All products processed!", pbar)
-                break
+            # Size charts are looked up in the background while the JSON fetches run
+            # Fetch the whole batch's Shopify JSON concurrently over the shared client
+            # Hosts known not to be Shopify go straight to the generic fallback
+            # Repeated product URLs share one request through shopify_cache
+            fetch_tasks = {
+                product_id: (
+                    asyncio.create_task(skip_shopify_json(brand_url))
+                    if known_not_shopify(domain_cache, url_host(brand_url))
+                    else shopify_cache.fetch(client, brand_url, semaphore=fetch_sem, limiter=host_limiter,
+                                             validators=(etag, last_modified) if etag or last_modified else None)
+                )
+                for product_id, brand_url, _, _, _, etag, last_modified in products
+            }
+            chart_tasks = start_size_chart_tasks(size_chart_context, products, brand_cache, size_chart_sem,
+                                                 fetch_tasks, no_embedded_chart, mark_brand_cache_dirty)
+            fetched = await asyncio.gather(*fetch_tasks.values(), return_exceptions=True)
             
-            for product in products:
-                product_id = product["id"]
-                brand_url = product["brand_url"]
-                category = (product.get("category") or "").lower().strip()
-                title = product.get("title") or "Unknown"
-                short_title = title[:45] + "…" if len(title) > 45 else title
+            for product, fetch_result in zip(products, fetched):
+                product_id, brand_url, category, title, stored_hash, stored_etag, stored_last_modified = product
+                title = title or "Unknown"
+                short_title = title[:SHORT_TITLE_LEN] + "…" if len(title) > SHORT_TITLE_LEN else title
                 
-                progress["total_processed"] += 1
+                window_processed += 1
                 
                 # Update progress bar description with current product
                 pbar.set_postfix_str(f"{short_title}", refresh=True)
@@ -528,27 +1324,51 @@ async def main():
                 
                 try:
                     # Fetch product data
-                    try:
-                        shopify_data = fetch_shopify_json(brand_url)
-                    except (httpx.HTTPStatusError, httpx.RequestError, json.JSONDecodeError, Exception) as e_shopify:
+                    if isinstance(fetch_result, BaseException):
+                        raise fetch_result
+                    ok, shopify_data, validators = fetch_result
+                    host = url_host(brand_url)
+                    if ok and domain_cache.get(host, {}).get("shopify") is not True:
+                        domain_cache[host] = {"shopify": True}
+                        domain_cache_dirty = True
+                    if ok and shopify_data is NOT_MODIFIED:
+                        # 304: nothing to parse or write
+                        session_unchanged += 1
+                        log(f"UNCHANGED (304): {brand_url}", pbar)
+                        pbar.update(1)
+                        continue
+                    if not ok:
+                        shopify_error, shopify_data = shopify_data, None
+                        generic_data = None
                         if fetch_generic_product_data:
                             try:
-                                generic_data = await fetch_generic_product_data(brand_url)
-                                if generic_data and generic_data.get('title'):
-                                    shopify_data = adapt_generic_data_to_shopify_format(generic_data)
-                                    log(f"  ↻ Fallback OK: {short_title}", pbar)
-                                else:
-                                    raise e_shopify
+                                if generic_pool is None:
+                                    generic_pool = await BrowserPool().start()
+                                # force: the updater wants the live page, not the CLI's result cache
+                                generic_data = await fetch_generic_product_data(brand_url, pool=generic_pool,
+                                                                                force=True, fields=GENERIC_FIELDS)
                             except Exception:
-                                raise e_shopify
+                                pass
+                        if generic_data and generic_data.get('title'):
+                            shopify_data = adapt_generic_data_to_shopify_format(generic_data)
+                            log(f"  ↻ Fallback OK: {short_title}", pbar)
+                            # Only a definitive .js failure on a host that also fails the Shopify
+                            # probe is remembered; timeouts, 429s and 5xx say nothing about the store
+                            if (not known_not_shopify(domain_cache, host)
+                                    and is_definitive_json_failure(shopify_error)
+                                    and await probe_shopify(client, host) is False):
+                                domain_cache[host] = {"shopify": False, "checked_at": int(time.time())}
+                                domain_cache_dirty = True
                         else:
-                            raise e_shopify
+                            # Report the original Shopify failure through the handlers below
+                            raise shopify_error
                     
                     # Scrape size chart (apparel only)
                     size_chart_html = None
                     if category == "apparel":
                         log(f"  📐 Size chart: {short_title}", pbar)
-                        size_chart_html = await scrape_size_chart(brand_url)
+                        chart_task = chart_tasks.pop(product_id, None)
+                        size_chart_html = await chart_task if chart_task else None
                         if size_chart_html:
                             log(f"  ✔ Size chart found ({len(size_chart_html)} chars)", pbar)
                             session_size_charts += 1
@@ -557,34 +1377,31 @@ async def main():
                             log(f"  ✖ No size chart", pbar)
                             session_no_size_charts += 1
                         
-                    # Update database
-                    update_product(conn, product_id, shopify_data, size_chart_html)
-                    
-                    session_updated += 1
-                    progress["total_updated"] += 1
-                    log(f"COMPLETED: {brand_url}", pbar)
+                    # Queue database update (flushed once per id window) unless nothing changed
+                    data_hash = content_hash(shopify_data, size_chart_html)
+                    # New validators are written even when the data is the same, so the next run can send them
+                    if (stored_hash is not None and bytes(stored_hash) == data_hash
+                            and (validators or (None, None)) == (stored_etag, stored_last_modified)):
+                        session_unchanged += 1
+                        log(f"UNCHANGED: {brand_url}", pbar)
+                    else:
+                        pending_updates.append(build_update_row(product_id, shopify_data, size_chart_html, data_hash,
+                                                               validators))
+                        pending_urls[product_id] = brand_url
+                        session_updated += 1
+                        progress["total_updated"] += 1
+                        log(f"COMPLETED: {brand_url}", pbar)
                     
                     
                 except httpx.HTTPStatusError as e:
-                    try:
-                        conn.rollback()
-                    except:
-                        pass
-                    
                     if e.response.status_code == 404:
-                        try:
-                            with conn.cursor() as cur:
-                                cur.execute("DELETE FROM scraped_products WHERE id = %s", (product_id,))
-                            conn.commit()
-                            log(f"  🗑 Deleted (404): {short_title}", pbar)
-                            session_deleted += 1
-                            pbar.update(1)
-                            last_id = product_id
-                            progress["last_processed_id"] = last_id
-                            continue
-                        except Exception as del_e:
-                            conn.rollback()
-                            log(f"  ✖ Delete failed: {del_e}", pbar)
+                        # Deleted together with the window's updates
+                        pending_deletes.append(product_id)
+                        pending_urls[product_id] = brand_url
+                        log(f"  🗑 Deleted (404): {short_title}", pbar)
+                        session_deleted += 1
+                        pbar.update(1)
+                        continue
 
                     save_error(product_id, brand_url, str(e), "http")
                     log(f"  ✖ HTTP {e.response.status_code}: {short_title}", pbar)
@@ -594,10 +1411,6 @@ async def main():
                     
                     
                 except httpx.RequestError as e:
-                    try:
-                        conn.rollback()
-                    except:
-                        pass
                     save_error(product_id, brand_url, str(e), "request")
                     log(f"  ✖ Request failed: {short_title}", pbar)
                     session_errors += 1
@@ -606,29 +1419,39 @@ async def main():
                     
                     
                 except Exception as e:
-                    try:
-                        conn.rollback()
-                    except:
-                        pass
                     save_error(product_id, brand_url, str(e), "unknown")
                     log(f"  ✖ Error: {short_title} — {str(e)[:60]}", pbar)
                     session_errors += 1
                     progress["total_errors"] += 1
                     log(f"Completed (Error): {brand_url}", pbar)
                 
-                # Update last processed ID and advance progress bar
-                last_id = product_id
-                progress["last_processed_id"] = last_id
+                # Advance progress bar
                 pbar.update(1)
-                
-                # Save progress every 10 products
-                if progress["total_processed"] % 10 == 0:
-                    save_progress(progress)
             
-            # Save progress after each batch
-            save_progress(progress)
+            await cancel_tasks(chart_tasks)
             
-            await asyncio.sleep(0.5)
+            # Write the whole id window in the background while the next one is fetched
+            if window_done_id is not None:
+                # One writer connection, and resume points must land in order
+                if flush_task is not None:
+                    await flush_task
+                flush_task = asyncio.create_task(
+                    flush_window(pending_updates, pending_deletes, pending_urls, window_done_id, window_processed)
+                )
+                pending_updates, pending_deletes, pending_urls = [], [], {}
+                window_processed = 0
+                if generic_pool is not None:
+                    await generic_pool.close_contexts()
+            if brand_cache_dirty:
+                brand_cache_dirty = False
+                await asyncio.to_thread(save_brand_cache, dict(brand_cache))
+            if domain_cache_dirty and window_done_id is not None:
+                domain_cache_dirty = False
+                await asyncio.to_thread(save_domain_cache, dict(domain_cache))
+        
+        if flush_task is not None:
+            await flush_task
+        log("✔ All products processed!", pbar)
             
     except KeyboardInterrupt:
         log("\n⏸ Interrupted — progress saved!", pbar)
@@ -636,8 +1459,37 @@ async def main():
         
     finally:
         pbar.close()
+        await cancel_tasks(chart_tasks)
+        try:
+            batches.close()
+        except Exception:
+            pass
+        await client.aclose()
+        if generic_pool is not None:
+            await generic_pool.close()
+        if size_chart_context is not None:
+            await size_chart_context.close()
+        if playwright is not None:
+            await playwright.stop()
+        # Awaiting a finished task re-raises its exception, so a failed last flush is reported too
+        if flush_task is not None and not flush_task.cancelled():
+            try:
+                await flush_task
+            except Exception as e:
+                log(f"✖ Background batch update failed: {e}")
+        try:
+            flush_updates(conn, pending_updates)
+            delete_products(conn, pending_deletes)
+        except Exception as e:
+            log(f"✖ Final batch update failed: {e}")
         conn.close()
+        conn_read.close()
         save_progress(progress)
+        close_error_log()
+        if brand_cache_dirty:
+            save_brand_cache(brand_cache)
+        if domain_cache_dirty:
+            save_domain_cache(domain_cache)
         
         # Summary
         print()
@@ -647,6 +1499,7 @@ async def main():
         print(f"  Updated:      {session_updated:,}")
         print(f"  Errors:       {session_errors:,}")
         print(f"  Deleted(404): {session_deleted:,}")
+        print(f"  Unchanged:    {session_unchanged:,}")
         print(f"  Size charts:  ✔ {session_size_charts:,}  ✖ {session_no_size_charts:,}")
         print("─" * 55)
         print(f"  TOTAL Done:   {progress['total_processed']:,} / {total_all:,}")
@@ -656,4 +1509,9 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if sys.argv[1:] == ["--export-errors"]:
+        export_errors()
+    elif sys.argv[1:] == ["--create-index"]:
+        create_updater_index()
+    else:
+        asyncio.run(main())
@@ -1,11 +1,22 @@
 import asyncio
+import atexit
+import logging
+import logging.handlers
+import queue
 import re
 import os
 import sys
 import json
+import time
 import argparse
+from collections import OrderedDict
 from urllib.parse import urlparse
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Force UTF-8 encoding for console output on Windows
 if sys.platform == 'win32':
@@ -15,1021 +26,1417 @@ if sys.platform == 'win32':
 # Cache file for storing detected brand types
 BRAND_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "brand_types.json")
 
+# Log lines are handed to a background thread, so console writes never block the event loop
+logger = logging.getLogger("size_chart")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_console_handler = logging.StreamHandler(sys.stdout)
+_console_handler.setFormatter(logging.Formatter("%(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _console_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# Set SC_DEBUG=1 to print the page scripts' step-by-step logs
+DEBUG = os.environ.get("SC_DEBUG") == "1"
+
+# A domain becomes a cached 'NONE' entry (skipped without opening a page) after this many
+# consecutive scrapes found no chart, and is re-checked once the entry is older than the TTL
+NO_CHART_MISSES = 3
+NO_CHART_TTL = 7 * 24 * 60 * 60
+
+# brand_types.json keeps at most this many domains, least recently used dropped first
+BRAND_CACHE_MAX = 10000
+
+# Process-wide brand cache, read from disk on first use (see get_brand_cache)
+_brand_cache = None
+
 def ask_url():
     return input("Enter product URL: ").strip()
 
 def get_domain(url):
     """Extract domain from URL (e.g., 'lovegen.com' from 'https://lovegen.com/products/...')"""
     parsed = urlparse(url)
-    domain = parsed.netloc.lower()
+    domain = (parsed.hostname or "").rstrip('.')  # lowercased, without port or credentials
+    # Unicode domains are keyed by their IDNA (punycode) form
+    try:
+        domain = domain.encode('idna').decode('ascii')
+    except UnicodeError:
+        pass
     # Remove www. prefix if present
     if domain.startswith('www.'):
         domain = domain[4:]
     return domain
 
 def load_brand_cache():
-    """Load cached brand types from JSON file."""
-    if os.path.exists(BRAND_CACHE_FILE):
-        try:
-            with open(BRAND_CACHE_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    """Load cached brand types from JSON file, oldest-used domain first."""
+    try:
+        with open(BRAND_CACHE_FILE, 'rb') as f:
+            data = f.read()
+        return OrderedDict(orjson.loads(data) if orjson else json.loads(data))
+    except (OSError, ValueError):
+        return OrderedDict()
+
+def touch_brand(cache, domain):
+    """Mark a cached domain as just used, so it is the last to be dropped at BRAND_CACHE_MAX."""
+    if isinstance(cache, OrderedDict) and domain in cache:
+        cache.move_to_end(domain)
+
+def print_logs(label, logs, verbose=DEBUG):
+    """Write a page script's log lines in one go when verbose (SC_DEBUG=1), otherwise just count them."""
+    if not logs:
+        return
+    if verbose:
+        logger.info("\n".join(f"{label}: {msg}" for msg in logs))
+    else:
+        logger.info(f"{label}: {len(logs)} messages (SC_DEBUG=1 to show)")
+
+def get_brand_cache():
+    """Return the shared brand cache dict, loading it from disk only the first time."""
+    global _brand_cache
+    if _brand_cache is None:
+        _brand_cache = load_brand_cache()
+    return _brand_cache
 
 def save_brand_cache(cache):
-    """Save brand types cache to JSON file."""
-    with open(BRAND_CACHE_FILE, 'w') as f:
-        json.dump(cache, f, indent=2)
+    """Save brand types cache to JSON file (atomically, so concurrent writers never leave it half-written)."""
+    tmp_file = f"{BRAND_CACHE_FILE}.{os.getpid()}.tmp"
+    if len(cache) > BRAND_CACHE_MAX:
+        cache = dict(list(cache.items())[-BRAND_CACHE_MAX:])
+    if orjson:
+        data = orjson.dumps(cache, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(cache, indent=2).encode('utf-8')
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, BRAND_CACHE_FILE)
 
-class SizeChartScraper:
-    def __init__(self, url, headless=True):
-        self.url = url
-        self.headless = headless
-        self.user_data_dir = os.path.abspath("./user_data")
-        self.detected_type = None  # Will be set by detect_size_chart_type
-        self.domain = get_domain(url)
-        self.brand_cache = load_brand_cache()
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
+BROWSER_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-infobars",
+    "--window-position=0,0",
+    "--ignore-certificate-errors",
+    "--ignore-certificate-errors-spki-list",
+    f"--user-agent={USER_AGENT}"
+]
 
-    async def detect_size_chart_type(self, page):
-        """Analyzes the page to detect what type of size chart implementation is used."""
-        result = await page.evaluate("""
-            () => {
-                const types = [];
-                
-                // Check for Modal libraries
-                // iLoveMySize
-                if (document.querySelector('.ilm-sizechart-embed, .ilmsc-button, .ilm-sizechart-block')) {
-                    types.push({ type: 'MODAL_ILMS', confidence: 90, selector: '.ilmsc-modal' });
+# Requests aborted in scraping contexts. Images, stylesheets and scripts always load: extraction
+# ranks chart images by naturalWidth, checks computed visibility and needs the modal scripts.
+BLOCKED_RESOURCE_TYPES = {"font", "media", "websocket", "texttrack", "eventsource", "manifest"}
+BLOCKED_HOSTS = re.compile(
+    r"google-analytics|googletagmanager|googleadservices|googlesyndication|doubleclick|facebook\.net"
+    r"|facebook\.com/tr|hotjar|clarity\.ms|bat\.bing|analytics\.tiktok|ct\.pinterest|segment\.(io|com)"
+    r"|criteo|taboola|outbrain|fullstory"
+)
+
+async def block_extras(route):
+    """Abort fonts, media and analytics/ad requests; everything else continues."""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or BLOCKED_HOSTS.search(request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def launch_context(p, user_data_dir, headless=True):
+    """Launch the persistent browser context every page of a run is opened in."""
+    logger.info(f"Launching browser with user data: {user_data_dir}")
+    context = await p.chromium.launch_persistent_context(
+        user_data_dir,
+        headless=headless,
+        args=BROWSER_ARGS,
+        viewport={"width": 1280, "height": 800},
+        user_agent=USER_AGENT
+    )
+    # Add stealth scripts (applies to every page opened in the context)
+    await context.add_init_script("""
+        Object.defineProperty(navigator, 'webdriver', {
+            get: () => undefined
+        });
+    """)
+    # Page scripts are installed once per document and called by name, instead of re-sent per evaluate
+    await context.add_init_script(PAGE_SCRIPTS_INIT)
+    await context.route("**/*", block_extras)
+    return context
+
+# Element each detected type's popup/panel shows up as after its trigger is clicked
+POPUP_SELECTOR_BY_TYPE = {
+    'MODAL_ILMS': '.ilmsc-modal',
+    'MODAL_MFP': '.mfp-content',
+    'MODAL_PSWP': '.pswp--open',
+    'MODAL_BOOTSTRAP': '.modal.show',
+    'MODAL_KIWI': '.kiwi-sizing-modal, .ks-chart-container, .ks-modal-content',
+    'MODAL_SCR': '.scr-modal',
+    'MODAL_AVADA': '#avada-modal-content, .Avada-Modal__ContainerWrapper',
+    'ACCORDION': 'details[open]',
+    'TAB': '[role="tabpanel"]',
+}
+
+# Common popup containers, checked in order when the type-specific wait didn't cover it
+POPUP_SELECTORS = [
+    ".mfp-content", ".ilmsc-modal", ".pswp--open", ".modal.show",
+    ".scr-modal", "[class*='sizechart']", ".size-guide-modal", ".popup-content",
+    ".drawer.is-active", ".modal-open", "[aria-modal='true']",
+    "#avada-modal-content", ".Avada-Modal__ContainerWrapper"
+]
+
+# Page scripts, kept at module level so each call only sends the script and its small argument
+
+# Finds which size chart implementation (modal app, accordion, tab, inline...) the page uses
+DETECT_TYPE_JS = """
+    () => {
+        const types = [];
+
+        // Inline size chart patterns (already visible on page): ai-size-chart, size-chart, sizechart, etc.
+        const inlineSelectors = [
+            '[class*="size-chart"]',
+            '[class*="sizechart"]', 
+            '[class*="size_chart"]',
+            '[class*="sizeChart"]',
+            '[id*="size-chart"]',
+            '[id*="sizechart"]',
+            '.size-guide-table',
+            'table[class*="size"]'
+        ];
+
+        // Everything detection looks for, found in a single document walk
+        const groups = {
+            ilms: '.ilm-sizechart-embed, .ilmsc-button, .ilm-sizechart-block',       // iLoveMySize
+            mfp: '.mfp, .sizelink, [data-mfp-src], a[href*="mfp"]',                   // Magnific Popup
+            pswp: '.pswp, [data-pswp], .t4s-btn__size-chart',                         // PhotoSwipe
+            bootstrap: '[data-toggle="modal"], [data-bs-toggle="modal"]',             // Generic modal triggers
+            accordionRow: 'details summary, collapsible-row',
+            productAccordion: '.product__accordion, .accordion',                       // Shopify Dawn theme style
+            tablist: '[role="tablist"], .product-tabs, .tabs',
+            tab: '[role="tab"], .tab-button, .tabs button',
+            inline: inlineSelectors.join(', '),
+            scr: '.scr-modal, .scr-open-size-chart, [class*="scr-open-size"]',        // SCR Size Chart app
+            avada: '#avada-modal-content, .Avada-Modal__ContainerWrapper, [class*="Avada-Modal"]',
+            kiwi: '.ks-chart-container, .kiwi-sizing-modal, .ks-modal-content, [id*="kiwi-sizing"]',
+            kiwiIframe: 'iframe[src*="kiwisizing"]',
+            sizeLink: 'a[href*="size"], a[href*="chart"]'                              // maybe direct image links
+        };
+        const names = Object.keys(groups);
+        const hits = {};  // group -> first element that qualifies for it
+        let found = 0;
+        for (const el of document.querySelectorAll(Object.values(groups).join(', '))) {
+            for (const name of names) {
+                if (hits[name] || !el.matches(groups[name])) continue;
+                if (name === 'tab' && !/size/i.test(el.innerText)) continue;
+                if (name === 'inline' && !(el.offsetWidth > 0 || el.offsetHeight > 0)) continue;
+                if (name === 'sizeLink' && !/\\.(jpg|png|webp|gif)/i.test(el.href)) continue;
+                hits[name] = el;
+                found++;
+            }
+            if (found === names.length) break;
+        }
+
+        // Classify, in the same order as before so equal confidences keep their priority
+        if (hits.ilms) {
+            types.push({ type: 'MODAL_ILMS', confidence: 90, selector: '.ilmsc-modal' });
+        }
+        if (hits.mfp) {
+            types.push({ type: 'MODAL_MFP', confidence: 85, selector: '.mfp-content' });
+        }
+        if (hits.pswp) {
+            types.push({ type: 'MODAL_PSWP', confidence: 85, selector: '.pswp__scroll-wrap' });
+        }
+        if (hits.bootstrap) {
+            types.push({ type: 'MODAL_BOOTSTRAP', confidence: 70, selector: '.modal.show' });
+        }
+
+        // Accordions: only the first summary/collapsible row is checked for 'size'
+        if (hits.accordionRow && (hits.accordionRow.innerText?.toLowerCase() || '').includes('size')) {
+            types.push({ type: 'ACCORDION', confidence: 80, selector: 'details[open]' });
+        }
+        if (hits.productAccordion) {
+            types.push({ type: 'ACCORDION', confidence: 60, selector: 'details[open]' });
+        }
+
+        // Tab panels with a size tab
+        if (hits.tablist && hits.tab) {
+            types.push({ type: 'TAB', confidence: 75, selector: '[role="tabpanel"]' });
+        }
+
+        if (hits.inline) {
+            types.push({ 
+                type: 'INLINE', 
+                confidence: 85, 
+                selector: inlineSelectors.find(sel => hits.inline.matches(sel)),
+                foundElement: hits.inline.className?.substring?.(0, 50)
+            });
+        }
+
+        if (hits.scr) {
+            types.push({ type: 'MODAL_SCR', confidence: 90, selector: '.scr-modal' });
+        }
+        if (hits.avada) {
+            types.push({ type: 'MODAL_AVADA', confidence: 85, selector: '#avada-modal-content' });
+        }
+        if (hits.kiwi) {
+            types.push({ type: 'MODAL_KIWI', confidence: 95, selector: '.kiwi-sizing-modal' });
+        }
+        if (hits.kiwiIframe) {
+            types.push({ type: 'MODAL_KIWI', confidence: 95, selector: '.kiwi-sizing-modal' });
+        }
+
+        if (hits.sizeLink) {
+            types.push({ type: 'DIRECT_IMAGE', confidence: 65, selector: null, url: hits.sizeLink.href });
+        }
+
+        // Sort by confidence
+        types.sort((a, b) => b.confidence - a.confidence);
+
+        return {
+            detectedTypes: types,
+            primaryType: types.length > 0 ? types[0] : { type: 'UNKNOWN', confidence: 0 }
+        };
+    }
+"""
+
+# Collects size-chart-looking images from the product gallery (fallback when the DOM has no chart)
+GALLERY_IMAGES_JS = """
+    () => {
+        const sizeRegex = /size[_-]?(chart|guide)|measurement|sizing/i;
+
+        // Helper to clean URL (remove query params and normalize protocol) without temporary arrays
+        const cleanUrl = (url) => {
+            const q = url.indexOf('?');
+            const clean = q === -1 ? url : url.substring(0, q);
+            return clean.startsWith('//') ? 'https:' + clean : clean;
+        };
+
+        // Main product gallery images, plus any image with a srcset, in one query
+        const gallerySelector =
+            '.product-media img, .product__media img, .product-single__media img, ' +
+            '.product-image-gallery img, .product-gallery img, [data-product-media] img, ' +
+            '.product__slides img, .slick-slide img, .swiper-slide img';
+        const fromGallery = [];
+        const fromSrcset = [];
+        for (const img of document.querySelectorAll(gallerySelector + ', img[srcset], img[data-srcset]')) {
+            if (img.matches(gallerySelector)) {
+                const src = img.src || img.dataset?.src || '';
+                if (sizeRegex.test(src)) {
+                    fromGallery.push(cleanUrl(src));
                 }
-                
-                // Magnific Popup
-                if (document.querySelector('.mfp, .sizelink, [data-mfp-src], a[href*="mfp"]')) {
-                    types.push({ type: 'MODAL_MFP', confidence: 85, selector: '.mfp-content' });
+            }
+
+            // Also check srcset/data-srcset for size chart images
+            const srcset = img.srcset || img.dataset?.srcset || '';
+            if (srcset && sizeRegex.test(srcset)) {
+                // Extract highest quality URL from srcset (the last candidate's URL)
+                const last = srcset.substring(srcset.lastIndexOf(',') + 1).trim();
+                const space = last.indexOf(' ');
+                const match = space === -1 ? last : last.substring(0, space);
+                if (match) {
+                    fromSrcset.push(cleanUrl(match));
                 }
-                
-                // PhotoSwipe
-                if (document.querySelector('.pswp, [data-pswp], .t4s-btn__size-chart')) {
-                    types.push({ type: 'MODAL_PSWP', confidence: 85, selector: '.pswp__scroll-wrap' });
+            }
+        }
+
+        // Gallery hits rank ahead of srcset hits, as when these were two passes
+        return Array.from(new Set(fromGallery.concat(fromSrcset)));
+    }
+"""
+
+# Elements INTERACT_JS considers as size chart triggers. Divs/spans only via their class; the
+# fallback (every div/span) is scanned only when nothing in TRIGGER_SELECTOR matches.
+TRIGGER_SELECTOR = ("button, a, summary, collapsible-row, .size-guide, .size-chart, .sizelink, .mfp, "
+                    "[class*='size' i], [class*='chart' i], [class*='guide' i]")
+TRIGGER_FALLBACK_SELECTOR = "button, a, span, div, summary, .size-guide, .size-chart, .sizelink, .mfp, collapsible-row"
+
+# Clicks size chart triggers (buttons, links, accordions) matching the keywords; takes the candidate selector
+INTERACT_JS = """
+    ([selector, fallbackSelector]) => {
+        const logs = [];
+        // Lines are only kept when the caller asked for them (see run_page_script)
+        const verbose = window.__sc_verbose === true;
+        function log(msg) { if (verbose) logs.push(msg); }
+
+        log("Starting interactions...");
+        // Primary keywords - specific size chart terms
+        const primaryKeywords = /size[\\s_-]*(chart|guide|help|specs|match|recommendation|link)|measurements|dimensions|sizing[\\s_-]*(chart|guide)|body[\\s_-]*(chart|guide)|find\\s*my\\s*size|sizelink/i;
+
+        // Secondary keywords - standalone 'size' for accordion titles (must be short text)
+        const accordionKeywords = /^size$/i;
+
+        // Debug implicit .sizelink
+        const sl = document.querySelector('.sizelink');
+        if (sl) log(`[DEBUG] .sizelink found. Text: "${sl.textContent}" InnerText: "${sl.innerText}" Class: "${sl.className}"`);
+
+        function isClickable(el) {
+            const style = window.getComputedStyle(el);
+            const rect = el.getBoundingClientRect();
+            const visible = (rect.width > 0 || rect.height > 0 || el.getClientRects().length > 0) && style.visibility !== 'hidden';
+            return visible;
+        }
+
+        // Returns how many elements matched (and were considered for clicking)
+        function scan(elements) {
+            let matched = 0;
+            for (const el of elements) {
+                const tag = el.tagName.toLowerCase();
+                let textToCheck = "";
+                if (tag === 'collapsible-row') {
+                     const label = el.querySelector('[slot="heading"], summary, .accordion__title');
+                     textToCheck = label ? label.textContent : el.textContent;
+                } else {
+                     // textContent doesn't force layout like innerText; collapse its whitespace instead
+                     textToCheck = (el.textContent || "").replace(/\\s+/g, ' ').trim();
+                     if (textToCheck.length > 100) continue; 
                 }
-                
-                // Generic modal triggers
-                if (document.querySelector('[data-toggle="modal"], [data-bs-toggle="modal"]')) {
-                    types.push({ type: 'MODAL_BOOTSTRAP', confidence: 70, selector: '.modal.show' });
+                textToCheck = (textToCheck || "").trim();
+
+                // Lowercased once per element and reused by every check below
+                const lc = textToCheck.toLowerCase();
+
+                // Cheap substring prefilter: every keyword pattern below contains one of these
+                const hay = lc + ' ' + ((el.title || '') + ' ' +
+                             (typeof el.className === 'string' ? el.className : '')).toLowerCase();
+                if (!(hay.includes('siz') || hay.includes('chart') || hay.includes('guide') ||
+                      hay.includes('measurements') || hay.includes('dimensions'))) continue;
+
+                // Explicit validation to avoid "Sizing is actually accurate"
+                if (/actually\\s*accurate/i.test(textToCheck)) {
+                    if (lc.includes("size")) log(`[SKIP] Excluded phrase: "${textToCheck}"`);
+                    continue;
                 }
-                
-                // Check for Accordions
-                const sizeAccordion = document.querySelector('details summary, collapsible-row');
-                if (sizeAccordion) {
-                    const text = sizeAccordion.innerText?.toLowerCase() || '';
-                    if (text.includes('size')) {
-                        types.push({ type: 'ACCORDION', confidence: 80, selector: 'details[open]' });
-                    }
+
+                // Check for accordion elements (SUMMARY, DETAILS) - allow standalone "size"
+                const isAccordion = (tag === 'summary' || tag === 'details') || 
+                                   el.closest('details') !== null ||
+                                   el.classList.contains('accordion__title') ||
+                                   el.classList.contains('summary__title');
+
+                let match = (textToCheck && primaryKeywords.test(textToCheck)) ||
+                            (el.title && primaryKeywords.test(el.title)) ||
+                            (el.className && typeof el.className === 'string' && primaryKeywords.test(el.className));
+
+                // For accordion elements, also match standalone "size"
+                if (!match && isAccordion && accordionKeywords.test(textToCheck)) {
+                    match = true;
+                    log(`[ACCORDION MATCH] Standalone 'size' in ${el.tagName}`);
                 }
-                
-                // Check for product accordions (Shopify Dawn theme style)
-                if (document.querySelector('.product__accordion, .accordion')) {
-                    types.push({ type: 'ACCORDION', confidence: 60, selector: 'details[open]' });
+
+                if (!match && (lc.includes("size") || lc.includes("chart"))) {
+                     log(`[MISS] Text "${textToCheck}" did not match regex. Tag: ${el.tagName}`);
                 }
-                
-                // Check for Tab panels
-                if (document.querySelector('[role="tablist"], .product-tabs, .tabs')) {
-                    const tabTexts = Array.from(document.querySelectorAll('[role="tab"], .tab-button, .tabs button'));
-                    for (const tab of tabTexts) {
-                        if (/size/i.test(tab.innerText)) {
-                            types.push({ type: 'TAB', confidence: 75, selector: '[role="tabpanel"]' });
-                            break;
+
+                if (match) {
+                    matched++;
+                    const clickable = isClickable(el);
+                    log(`Match: <${el.tagName}> "${textToCheck}" Class: "${el.className}" Clickable: ${clickable}`);
+
+                    if (clickable) {
+                        el.setAttribute("data-sc-trigger", "true");
+                        log(`[ACTION] Clicking trigger: <${el.tagName}>`);
+
+                        if (tag === 'collapsible-row') {
+                            const summary = el.querySelector('summary, button');
+                            if (summary) summary.click();
+                            el.setAttribute("data-sc-priority", "true");
+                        } else if (tag === 'summary') {
+                            // Handle summary inside details - expand the details
+                            try { el.click(); } catch(e) { log(`Click error: ${e}`); }
+                            const parentDetails = el.closest('details');
+                            if (parentDetails) {
+                                parentDetails.setAttribute('open', 'true');
+                                parentDetails.setAttribute("data-sc-priority", "true");
+                                log(`[ACCORDION] Opened details element`);
+                            }
+                        } else if (tag === 'details') {
+                            // Directly clicked on details - open it
+                            el.setAttribute('open', 'true');
+                            el.setAttribute("data-sc-priority", "true");
+                            const summary = el.querySelector('summary');
+                            if (summary) summary.click();
+                            log(`[ACCORDION] Opened details element directly`);
+                        } else {
+                            // Check for aria-controls or data-target to identify specific modal
+                            const targetId = el.getAttribute('aria-controls') || el.getAttribute('data-target') || el.getAttribute('href');
+                            if (targetId) {
+                                const cleanId = targetId.replace('#', '');
+                                window._sc_target_modal_id = cleanId;
+                                log(`[TARGET] Set target modal ID to: ${cleanId}`);
+                            }
+
+                            try { el.click(); } catch(e) { log(`Click error: ${e}`); }
+
+                            // Check for MFP (Magnific Popup)
+                            if (el.className.includes('mfp') || el.className.includes('sizelink')) {
+                                log("[DEBUG] Clicked MFP trigger, setting flag...");
+                                window._sc_mfp_clicked = true;
+                            }
+
+                            // Propagate priority
+                            let p = el.parentElement;
+                            while(p && p !== document.body) {
+                                const t = p.tagName.toLowerCase();
+                                const c = (p.className || "").toString();
+                                if (t === 'details' || t === 'dialog' || c.includes('modal') || c.includes('popup') || c.includes('drawer')) {
+                                    p.setAttribute("data-sc-priority", "true");
+                                    if (t === 'details') p.setAttribute('open', 'true');
+                                    break;
+                                }
+                                p = p.parentElement;
+                            }
                         }
                     }
                 }
-                
-                // Check for inline size chart (already visible on page)
-                // Many patterns: ai-size-chart, size-chart, sizechart, etc.
-                const inlineSelectors = [
-                    '[class*="size-chart"]',
-                    '[class*="sizechart"]', 
-                    '[class*="size_chart"]',
-                    '[class*="sizeChart"]',
-                    '[id*="size-chart"]',
-                    '[id*="sizechart"]',
-                    '.size-guide-table',
-                    'table[class*="size"]'
-                ];
-                for (const sel of inlineSelectors) {
-                    const el = document.querySelector(sel);
-                    if (el && (el.offsetWidth > 0 || el.offsetHeight > 0)) {
-                        types.push({ 
-                            type: 'INLINE', 
-                            confidence: 85, 
-                            selector: sel,
-                            foundElement: el.className?.substring?.(0, 50)
-                        });
-                        break;
+            }
+            return matched;
+        }
+
+        // Narrow candidates first: clickable tags and size/chart/guide classes, no layout reads needed.
+        // Plain divs/spans are only scanned when none of those matched.
+        const elements = Array.from(document.querySelectorAll(selector));
+        log(`Found ${elements.length} candidate elements.`);
+        if (scan(elements) === 0) {
+            const checked = new Set(elements);
+            const rest = Array.from(document.querySelectorAll(fallbackSelector)).filter(el => !checked.has(el));
+            log(`No trigger among candidates, scanning ${rest.length} more elements.`);
+            scan(rest);
+        }
+        return logs;
+    }
+"""
+
+# Returns the first of the given selectors that matches anything on the page, or null
+FIRST_MATCH_JS = """
+    (selectors) => {
+        for (const s of selectors) {
+            if (document.querySelector(s)) return s;
+        }
+        return null;
+    }
+"""
+
+# True once the popup matching the selector has rendered a table, an image or real text
+POPUP_READY_JS = """
+    (selector) => {
+        const el = document.querySelector(selector);
+        return !!el && (!!el.querySelector('table, img') || (el.innerText || '').trim().length > 50);
+    }
+"""
+
+# Forces lazy-loaded images to load before extraction
+LOAD_LAZY_IMAGES_JS = """
+    async () => {
+        const pending = [];
+        // Force lazy images to load
+        document.querySelectorAll('img[data-src], img[data-srcset], img[loading="lazy"]').forEach(img => {
+            if (img.dataset.src) img.src = img.dataset.src;
+            if (img.dataset.srcset) img.srcset = img.dataset.srcset;
+            img.loading = 'eager';
+            pending.push(img);
+        });
+        // Also check for noscript images (common lazy pattern)
+        document.querySelectorAll('noscript').forEach(ns => {
+            const match = ns.innerHTML.match(/src=["']([^"']+)["']/);
+            if (match && ns.previousElementSibling?.tagName === 'IMG') {
+                ns.previousElementSibling.src = match[1];
+                pending.push(ns.previousElementSibling);
+            }
+        });
+        // Wait (here, after the src swaps) until those images settle, at most 1.5s
+        const loads = pending.filter(img => !img.complete).map(img => new Promise(resolve => {
+            img.addEventListener('load', resolve, { once: true });
+            img.addEventListener('error', resolve, { once: true });
+        }));
+        await Promise.race([
+            Promise.all(loads),
+            new Promise(resolve => setTimeout(resolve, 1500))
+        ]);
+    }
+"""
+
+# Extracts a table/images from a known size chart modal, if one is open
+MODAL_EXTRACT_JS = """
+    () => {
+        const logs = [];
+        // Lines are only kept when the caller asked for them (see run_page_script)
+        const verbose = window.__sc_verbose === true;
+        function log(msg) { if (verbose) logs.push(msg); }
+        const keywords = /size\\s*(chart|guide|help|specs|match|recommendation|link)|measurements|dimensions|sizing|t-shirt|womens|mens/i;
+        // Substring prefilter on lowercased input; every keywords alternative contains one of these
+        function kwHit(s) {
+            return (s.includes('siz') || s.includes('measurements') || s.includes('dimensions') ||
+                    s.includes('t-shirt') || s.includes('mens')) && keywords.test(s);
+        }
+
+        // Priority modal selectors - extract directly from these if they exist and are visible
+        const modalSelectors = [
+            // SCR Size Chart app modals
+            '.scr-modal', '[class*="scr-modal"]',
+            // JSC Size Chart app modals
+            '.jsc-modal', '.jsc-modal-body', '.jsc-modal-content', '.jsc-size-chart-modal',
+            '[class*="jsc-"]',
+            // Kiwi Sizing Modals
+            '.kiwi-sizing-modal', '.ks-chart-container', '.ks-modal-content', '[id*="kiwi-sizing"]',
+            // Avada Theme Modals
+            '#avada-modal-content', '.Avada-Modal__ContainerWrapper', '[class*="Avada-Modal"]',
+            // Other size chart modals
+            '.ilmsc-modal', '.ilmsc-modal-content', '.ilmsc-content', '.sizechart-container',
+            '.mfp-content', '.mfp-container', 
+            '.pswp--open .pswp__scroll-wrap', '.pswp__container', '.pswp__item',
+            '[class*="sizechart-modal"]', '[class*="size-chart-modal"]',
+            '.modal.show .modal-body', '.drawer.is-active', '[aria-modal="true"]'
+        ];
+
+        let modalContainer = null;
+        const modalTargetId = window._sc_target_modal_id;
+
+        // 1. Try to find modal by target ID if available
+        if (modalTargetId) {
+            log(`[TARGET] Looking for modal with ID: ${modalTargetId}`);
+            modalContainer = document.getElementById(modalTargetId);
+            if (!modalContainer) {
+                // Sometimes the ID is on a child div or parent wrapped in a dialog
+                modalContainer = document.querySelector(`[id*="${modalTargetId}"]`);
+            }
+        }
+
+        // 2. Fallback to generic search if no target ID or target not found
+        if (!modalContainer) {
+            log(`[SEARCH] Searching for active modal (no target ID match)...`);
+
+            // Collect all potential candidates
+            const candidates = Array.from(document.querySelectorAll(
+                '.product-popup-modal__content, .product-popup-modal, ' +
+                '[aria-modal="true"][role="dialog"], ' +
+                '.is-open[role="dialog"], .modal.open, .fancybox-content, ' +
+                '.scr-modal, [class*="scr-modal"], ' +
+                '#avada-modal-content, .Avada-Modal__ContainerWrapper, [class*="Avada-Modal"], ' +
+                '.ilmsc-modal, .ilmsc-modal-content, [class*="ilmsc"], ' +
+                '[class*="sizechart-modal"], [class*="size-chart-modal"], [class*="sizechart"], ' +
+                '.drawer__content, .drawer, [class*="drawer"]'
+            ));
+
+            let bestCandidate = null;
+            let bestScore = -1;
+
+            for (const cand of candidates) {
+                if (cand.offsetWidth < 10 && cand.offsetHeight < 10) continue; // Skip invisible
+
+                let score = 0;
+                const id = (cand.id || "").toLowerCase();
+                const cls = (cand.className || "").toLowerCase();
+                const text = (cand.innerText || "").substring(0, 500).toLowerCase();
+
+                // Scoring rules
+                if (id.includes('size') || id.includes('guide') || id.includes('chart')) score += 50;
+                if (cls.includes('size') || cls.includes('guide')) score += 30;
+                if (text.includes('size chart') || text.includes('size guide') || text.includes('measurement')) score += 20;
+                if (cand.querySelector('table')) score += 40;
+
+                // SCR Size Chart app - high priority modal
+                if (cls.includes('scr-modal')) score += 80;
+                // Avada Theme modals - high priority
+                if (cls.includes('avada-modal') || id.includes('avada-modal')) score += 80;
+
+                // Penalize inline containers that are just triggers/wrappers (not actual content holders)
+                // These often match sizechart-related classes but contain no content themselves
+                if (cls.includes('sizechart-inline') || cls.includes('best-fit-size')) {
+                    const hasContent = cand.querySelector('table, img');
+                    if (!hasContent) score -= 30;
+                }
+
+                // Negative scoring for common non-size popups
+                if (id.includes('newsletter') || cls.includes('newsletter')) score -= 50;
+                if (text.includes('subscribe') && text.includes('newsletter')) score -= 30;
+                if (id.includes('cart') || cls.includes('cart')) score -= 50;
+                if (text.includes('your cart is empty')) score -= 50;
+
+                log(`[CANDIDATE] Tag: ${cand.tagName} ID: ${cand.id} Class: ${cand.className.substring(0,30)} Score: ${score}`);
+
+                if (score > bestScore) {
+                    bestScore = score;
+                    bestCandidate = cand;
+                }
+            }
+
+            // Only use result if score is reasonable, or if we have no other option but it's a standard modal
+            if (bestCandidate && bestScore > -20) {
+                modalContainer = bestCandidate;
+                log(`[SELECTED] Best candidate score: ${bestScore}`);
+            }
+        }
+
+        // 3. Last resort: specific original list if above logic failed completely
+        if (!modalContainer) {
+            for (const sel of modalSelectors) {
+                const el = document.querySelector(sel);
+                // Check for visibility and size to ensure it's an active modal
+                if (el && (el.offsetWidth > 100 || el.offsetHeight > 100)) {
+                    log(`Found active modal via generic selector: ${sel}`);
+                    modalContainer = el;
+                    break;
+                }
+            }
+        }
+
+        if (!modalContainer) {
+            log("No active modal found, will use general extraction.");
+            return { table: null, images: [], logs: logs, foundModal: false };
+        }
+
+        // For JSC modals, prefer the body-wrapper for content extraction
+        const jscBody = modalContainer.querySelector('.jsc-modal-body-wrapper, .jsc-modal-body, .jsc-modal-content');
+        if (jscBody) {
+            log(`Using JSC body container: ${jscBody.className?.substring?.(0, 50)}`);
+            modalContainer = jscBody;
+        }
+
+        // For ILMS modals, prefer the content/body container to avoid header/footer noise
+        const ilmsBody = modalContainer.querySelector('.ilmsc-modal-content, .ilmsc-body, .ilmsc-content');
+        if (ilmsBody) {
+            log(`Using ILMS body container: ${ilmsBody.className?.substring?.(0, 50)}`);
+            modalContainer = ilmsBody;
+        }
+
+        // For Kiwi Sizing modals, prefer the chart container
+        const kiwiBody = modalContainer.querySelector('.ks-chart-container, .kiwi-sizing-modal-inner, .ks-modal-content');
+        if (kiwiBody) {
+            log(`Using Kiwi body container: ${kiwiBody.className?.substring?.(0, 50)}`);
+            modalContainer = kiwiBody;
+        }
+
+        log(`Extracting from modal container: ${modalContainer.className?.substring?.(0, 50)}`);
+
+        // Extract images from modal (live collection: no array or static NodeList is built up front)
+        const imgs = modalContainer.getElementsByTagName("img");
+        log(`Found ${imgs.length} images in modal.`);
+
+        // The n highest-scoring srcs, ties kept in page order
+        function topByScore(srcs, scores, n) {
+            const idx = Uint32Array.from(scores.keys());
+            idx.sort((a, b) => (scores[b] - scores[a]) || (a - b));
+            const top = [];
+            for (let k = 0; k < Math.min(n, idx.length); k++) top.push(srcs[idx[k]]);
+            return top;
+        }
+
+        // Parallel src/score arrays; only the top 3 srcs are returned
+        const srcs = [], scores = [];
+        const seen = new Set();
+
+        for (const img of imgs) {
+            let src = img.src || img.dataset?.src || "";
+            // Inline data URIs can be tens of kB: check the prefix (first char 'd' = 100) instead of scanning them
+            if (!src || (src.charCodeAt(0) === 100 && src.startsWith('data:image')) || src.includes('placeholder')) continue;
+
+            const srcLower = src.toLowerCase();
+            // Skip logos and icons
+            if (srcLower.includes('logo') || srcLower.includes('icon')) continue;
+            // Skip Shopify collection/category images (never size charts)
+            if (srcLower.includes('/collections/') || srcLower.includes('/collection/')) continue;
+
+            // Smart SVG filter: block icon-like SVGs, allow size-chart SVGs
+            if (srcLower.endsWith('.svg') || srcLower.includes('.svg?')) {
+                const svgName = srcLower.split('/').pop().split('?')[0];
+                if (!/size|chart|guide|measurement/i.test(svgName)) continue;
+            }
+
+            let score = 0;
+            const alt = (img.alt || "").toLowerCase();
+
+            if (kwHit(srcLower) || kwHit(alt)) score += 50;
+            if (srcLower.includes('sizeguide') || srcLower.includes('size_guide') || srcLower.includes('size-chart')) score += 40;
+            if (srcLower.includes('chart') || srcLower.includes('measurement')) score += 30; 
+
+            // width/height are already numbers (0 when unset), so |0 replaces parseInt
+            const naturalWidth = img.naturalWidth || img.width | 0;
+            const naturalHeight = img.naturalHeight || img.height | 0;
+
+            // INSIDE A SIZE CHART MODAL: Accept all images since the modal already confirms it's size chart context
+            // Only skip very small images (icons, etc)
+            if (!seen.has(src) && (naturalWidth > 50 || naturalHeight > 50 || score > 0)) {
+                srcs.push(src);
+                scores.push(score || 10);
+                seen.add(src);
+                log(`Modal image: ${src.substring(0, 60)}... Score: ${score || 10} Size: ${naturalWidth}x${naturalHeight}`);
+            } else if (!seen.has(src)) {
+                log(`Modal skipped (too small): ${src.substring(0, 60)}...`);
+            }
+        }
+
+        // Cell text of every row, filled into preallocated arrays
+        function readRows(table) {
+            const R = table.rows, nR = R.length, rows = new Array(nR);
+            for (let i = 0; i < nR; i++) {
+                const C = R[i].cells, nC = C.length, out = new Array(nC);
+                for (let j = 0; j < nC; j++) {
+                    const cell = C[j];
+                    // textContent doesn't force layout like innerText; collapse its whitespace instead
+                    let text = (cell.textContent || "").replace(/\\s+/g, ' ').trim();
+                    // Handle inputs in cells
+                    if (!text) {
+                        const input = cell.querySelector('input');
+                        if (input) text = input.value || input.placeholder || "";
                     }
+                    out[j] = text;
                 }
-                
-                // Check for SCR Size Chart app
-                if (document.querySelector('.scr-modal, .scr-open-size-chart, [class*="scr-open-size"]')) {
-                    types.push({ type: 'MODAL_SCR', confidence: 90, selector: '.scr-modal' });
+                rows[i] = out;
+            }
+            return rows;
+        }
+
+        // Extract tables from modal
+        const tables = Array.from(modalContainer.querySelectorAll("table"));
+        log(`Found ${tables.length} tables in modal.`);
+        let allTables = [];
+        for (const table of tables) {
+            const rows = readRows(table);
+            if (rows.length > 0 && rows[0].length > 0) {
+                log(`Table with ${rows.length} rows, ${rows[0].length} cols`);
+                allTables.push(rows);
+                break;  // only the first table is returned
+            }
+        }
+
+        // Also try to find div-based size charts (common in JSC apps)
+        if (allTables.length === 0) {
+            const sizeRows = modalContainer.querySelectorAll('[class*="size-row"], [class*="jsc-row"], .jsc-table-row');
+            if (sizeRows.length > 0) {
+                log(`Found ${sizeRows.length} div-based size rows`);
+            }
+        }
+
+        return { 
+            table: allTables.length ? allTables[0] : null, 
+            images: topByScore(srcs, scores, 3), 
+            logs: logs, 
+            foundModal: true 
+        };
+    }
+"""
+
+# LOAD_LAZY_IMAGES_JS then MODAL_EXTRACT_JS in a single evaluate
+LOAD_AND_MODAL_EXTRACT_JS = f"""
+    async () => {{
+        await ({LOAD_LAZY_IMAGES_JS})();
+        return ({MODAL_EXTRACT_JS})();
+    }}
+"""
+
+# General extraction: scores candidate containers and pulls table, images and text HTML from the best
+CONTAINER_EXTRACT_JS = """
+    async () => {
+        const logs = [];
+        // Lines are only kept when the caller asked for them (see run_page_script)
+        const verbose = window.__sc_verbose === true;
+        function log(msg) { if (verbose) logs.push(msg); }
+        const keywords = /size\\s*(chart|guide|help|specs|match|recommendation|link)|measurements|dimensions|sizing\\s*(chart|guide)|body\\s*(chart|guide)|find\\s*my\\s*size|sizelink|sizechart/i;
+        // Plain 'body' is on every page (CSS, "body" copy), so that alternative is matched whole
+        const bodyKeyword = /\\bbody\\s*(chart|guide)/;
+        // Substring prefilter on lowercased input; every keywords alternative passes one of these
+        function kwHit(s) {
+            return (s.includes('siz') || s.includes('measurements') || s.includes('dimensions') ||
+                    bodyKeyword.test(s)) && keywords.test(s);
+        }
+
+        // el's geometry comes from measure(), read before any scoring starts
+        function getScore(el, m) {
+            let score = 0;
+            const cls = (el.className || "").toString().toLowerCase();
+            const id = (el.id || "").toLowerCase();
+            const text = (el.innerText || "").toLowerCase();
+            const tag = el.tagName.toLowerCase();
+
+            // Penalize buttons/links as containers - they're triggers, not content
+            if (tag === 'button' || tag === 'a') score -= 100;
+
+            // Class checks stay substring matches (pswp__container, ilmsc-modal-inner... must still score),
+            // but are grouped behind the substring every check in the group shares, so the common
+            // case of a plain or unrelated class skips most of them
+            if (cls) {
+                if (cls.includes("siz")) {
+                    // HIGH PRIORITY: Explicit size chart containers (inline charts)
+                    // These should almost always win over generic sections
+                    if (cls.includes("ai-size-chart") || cls.includes("ai_size_chart")) score += 200;
+                    if (/size-chart|sizechart|size_chart/.test(cls) && !cls.includes('button') && !cls.includes('btn')) score += 150;
+
+                    // Class-based scoring for other size-related elements
+                    if (cls.includes("sizechart-container") || cls.includes("size-chart-content")) score += 60;
+                    if (cls.includes("size") && (cls.includes("chart") || cls.includes("guide"))) score += 30;
                 }
-                
-                // Check for Avada Theme Modals
-                if (document.querySelector('#avada-modal-content, .Avada-Modal__ContainerWrapper, [class*="Avada-Modal"]')) {
-                    types.push({ type: 'MODAL_AVADA', confidence: 85, selector: '#avada-modal-content' });
+
+                // Prioritize actual popup/modal containers
+                if (cls.includes("pswp") || cls.includes("photoswipe")) score += 80;
+                if (cls.includes("mfp-content") || cls.includes("mfp-wrap")) score += 70;
+                if (cls.includes("modal")) {
+                    if (cls.includes("modal-content") || cls.includes("modal-body")) score += 60;
+                    if (cls.includes("avada-modal")) score += 80;
                 }
-                
-                // Check for Kiwi Sizing Modals
-                if (document.querySelector('.ks-chart-container, .kiwi-sizing-modal, .ks-modal-content, [id*="kiwi-sizing"]')) {
-                    types.push({ type: 'MODAL_KIWI', confidence: 95, selector: '.kiwi-sizing-modal' });
+                if (cls.includes("ilm")) {
+                    if (cls.includes("ilmsc-modal") || cls.includes("ilmsc-content")) score += 80;
+                    if (cls.includes("ilm-sizechart") || cls.includes("ilmsc")) score += 50;
                 }
-                // Check iframes for Kiwi Sizing
-                const iframes = document.querySelectorAll('iframe');
-                for (const iframe of iframes) {
-                    if (iframe.src && iframe.src.includes('kiwisizing')) {
-                        types.push({ type: 'MODAL_KIWI', confidence: 95, selector: '.kiwi-sizing-modal' });
-                        break;
-                    }
+            }
+            if (id && /size-chart|sizechart|size_chart/.test(id)) score += 150;
+            if (!cls.includes("avada-modal") && id.includes("avada-modal")) score += 80;
+
+            if (el.hasAttribute("data-sc-priority")) score += 50;
+            if (el.hasAttribute("data-sc-trigger")) score -= 20; // Triggers are not content
+
+            // Tables in size chart containers are very valuable (scored once per table, see tally below)
+            const t = tally.get(el);
+            if (t) {
+                score += t.tableScore;
+                // Images with size-related names - boost only for relevant images
+                score += 40 * t.sizeRelevantImages;
+                // Penalize containers with many generic images (likely product galleries)
+                if (t.imgs > 5 && t.sizeRelevantImages === 0) score -= 50;
+            }
+
+            // Text content boost - but only if not too large (avoid body elements)
+            if (text.length < 5000 && kwHit(text.substring(0, 300))) score += 15;
+
+            // Size penalty for very small elements
+            if (m.w < 50 || m.h < 50) score -= 30;
+
+            return score;
+        }
+
+        // Narrow probe of known size chart / popup containers first; the broad div/section sweep
+        // only runs when none of those scores as a container
+        const NARROW_CANDIDATES = `
+            [class*="sizechart"], [class*="size-chart"], [class*="size_chart"], [id*="size-chart"], [id*="sizechart"],
+            [class*="ilm"], [class*="mfp-"], [class*="modal-"], [class*="jsc-"], [class*="pswp"], [class*="photoswipe"],
+            [class*="avada-modal"], [id*="avada-modal"], [data-sc-priority], [data-sc-trigger],
+            modal-dialog, details, .product-popup, .product-block, .product__info-container,
+            .drawer, .popup-content
+        `;
+        const BROAD_CANDIDATES = `div, section, ${NARROW_CANDIDATES}`;
+
+        // Tables and images are read once; each candidate pass only credits them to its ancestors
+        const tableHits = Array.from(document.querySelectorAll("table"), table => {
+            // Check if table looks like a size chart (has size-related headers)
+            const headerText = (table.rows[0]?.textContent || "").replace(/\\s+/g, ' ').toLowerCase();
+            // Size table - very high priority; generic table otherwise
+            return [table, /size|chest|waist|length|width|measurement/i.test(headerText) ? 80 : 25];
+        });
+        const imgHits = Array.from(document.querySelectorAll("img"), img => {
+            const src = (img.src || img.dataset?.src || "").toLowerCase();
+            const alt = (img.alt || "").toLowerCase();
+            return [img, kwHit(src) || kwHit(alt)];
+        });
+
+        // Nothing on the page can score: no tables, no keyword images, no keyword text and no
+        // element with a class/attribute getScore rewards. Bail before measuring any candidate.
+        const bodyText = (document.body?.textContent || "").toLowerCase();
+        if (!tableHits.length && !imgHits.some(([, relevant]) => relevant) &&
+            !(bodyText.includes('siz') || bodyText.includes('measurements') || bodyText.includes('dimensions') || bodyKeyword.test(bodyText)) &&
+            !document.querySelector(`
+                [class*="size" i], [id*="size" i], [class*="ilm" i], [class*="pswp" i], [class*="photoswipe" i],
+                [class*="mfp-" i], [class*="modal-content" i], [class*="modal-body" i], [class*="avada-modal" i],
+                [id*="avada-modal" i], [data-sc-priority]
+            `)) {
+            log("Fast bail: nothing size-related on the page.");
+            return { table: null, images: [], logs: logs };
+        }
+
+        const geom = new Map();
+        let tally = new Map();
+
+        // Size and visibility of one candidate; computed style is only read for boxes that render
+        function measure(el) {
+            const r = el.getBoundingClientRect();
+            let visible = !!(r.width || r.height || el.getClientRects().length);
+            if (visible) {
+                const cs = window.getComputedStyle(el);
+                visible = cs.display !== 'none' && cs.visibility !== 'hidden';
+            }
+            return { w: r.width, h: r.height, visible };
+        }
+
+        function pickBest(candidates) {
+            // Read every candidate's layout in one go, before any innerText reads, so layout is flushed once
+            for (const c of candidates) {
+                if (!geom.has(c)) geom.set(c, measure(c));
+            }
+
+            // Credit each table/img to every candidate that contains it,
+            // instead of two querySelectorAll walks per candidate
+            const candSet = new Set(candidates);
+            tally = new Map();
+            // One ancestor walk per node, adding all of its counts at once
+            function credit(node, tableScore, imgs, sizeRelevantImages) {
+                for (let a = node.parentElement; a; a = a.parentElement) {
+                    if (!candSet.has(a)) continue;
+                    let t = tally.get(a);
+                    if (!t) tally.set(a, t = { tableScore: 0, imgs: 0, sizeRelevantImages: 0 });
+                    t.tableScore += tableScore;
+                    t.imgs += imgs;
+                    t.sizeRelevantImages += sizeRelevantImages;
+                }
+            }
+            for (const [table, points] of tableHits) credit(table, points, 0, 0);
+            for (const [img, relevant] of imgHits) credit(img, 0, 1, relevant ? 1 : 0);
+
+            let best = null;
+            let max = -1;
+            for (const cand of candidates) {
+                const m = geom.get(cand);
+                if (!m.visible) continue;
+                const score = getScore(cand, m);
+                if (score > 15) log(`Candidate <${cand.tagName}> .${cand.className?.substring?.(0, 50)} Score: ${score}`);
+                if (score > max) {
+                    max = score;
+                    best = cand;
                 }
-                
-                // Check for size-related links that might be direct image links
-                const sizeLinks = document.querySelectorAll('a[href*="size"], a[href*="chart"]');
-                for (const link of sizeLinks) {
-                    if (/\\.(jpg|png|webp|gif)/i.test(link.href)) {
-                        types.push({ type: 'DIRECT_IMAGE', confidence: 65, selector: null, url: link.href });
-                        break;
+            }
+            return [best, max];
+        }
+
+        let [bestContainer, maxScore] = pickBest(document.querySelectorAll(NARROW_CANDIDATES));
+        if (!bestContainer || maxScore < 10) {
+            log("No narrow candidate, sweeping div/section.");
+            [bestContainer, maxScore] = pickBest(document.querySelectorAll(BROAD_CANDIDATES));
+        }
+
+        if (!bestContainer || maxScore < 10) {
+            log("No best container found.");
+            return { table: null, images: [], logs: logs };
+        }
+
+        log(`Best Container: <${bestContainer.tagName}> .${bestContainer.className?.substring?.(0, 50)} Score: ${maxScore}`);
+
+        // Cell text of every row, filled into preallocated arrays
+        function readRows(table) {
+            const R = table.rows, nR = R.length, rows = new Array(nR);
+            for (let i = 0; i < nR; i++) {
+                const C = R[i].cells, nC = C.length, out = new Array(nC);
+                for (let j = 0; j < nC; j++) {
+                    const cell = C[j];
+                    // textContent doesn't force layout like innerText; collapse its whitespace instead
+                    let text = (cell.textContent || "").replace(/\\s+/g, ' ').trim();
+                    // Handle inputs in cells
+                    if (!text) {
+                        const input = cell.querySelector('input');
+                        if (input) text = input.value || input.placeholder || "";
                     }
+                    out[j] = text;
                 }
-                
-                // Sort by confidence
-                types.sort((a, b) => b.confidence - a.confidence);
-                
-                return {
-                    detectedTypes: types,
-                    primaryType: types.length > 0 ? types[0] : { type: 'UNKNOWN', confidence: 0 }
-                };
+                rows[i] = out;
             }
-        """)
+            return rows;
+        }
+
+        // Extract Tables
+        let tables = Array.from(bestContainer.querySelectorAll("table"));
+        let allTables = [];
+        for (const table of tables) {
+            // A table with at most one body row and no size-like header is not a chart; skip reading its cells
+            if (table.rows.length < 3) {
+                const hdr = (table.rows[0]?.textContent || "").replace(/\\s+/g, ' ').toLowerCase();
+                if (!/size|chest|waist|length|width|measurement|cm|inch/.test(hdr)) continue;
+            }
+            const rows = readRows(table);
+            if (rows.length > 0 && rows[0].length > 0) {
+                allTables.push(rows);
+                break;  // only the first table is returned
+            }
+        }
+
+        // Extract Images - comprehensive approach
+        const allImgs = bestContainer.getElementsByTagName("img");
+        log(`Found ${allImgs.length} images in best container.`);
+
+        // The n highest-scoring srcs, ties kept in page order
+        function topByScore(srcs, scores, n) {
+            const idx = Uint32Array.from(scores.keys());
+            idx.sort((a, b) => (scores[b] - scores[a]) || (a - b));
+            const top = [];
+            for (let k = 0; k < Math.min(n, idx.length); k++) top.push(srcs[idx[k]]);
+            return top;
+        }
+
+        // Parallel src/score arrays; only the top 3 srcs are returned
+        const srcs = [], scores = [];
+        const seen = new Set();
+
+        // Container context boost, the same for every image in it
+        const bestCls = bestContainer.className?.includes ? bestContainer.className : "";
+        let containerBoost = 0;
+        if (bestCls.includes("sizechart") || bestCls.includes("ilm")) containerBoost += 20;
+        if (bestCls.includes("mfp-content")) containerBoost += 15;
+
+        for (const img of allImgs) {
+             // Get src from multiple possible attributes
+             const ds = img.dataset;
+             let src = img.src || ds.src || ds.lazySrc || "";
+             if (!src && img.srcset) {
+                 src = img.srcset.split(',', 1)[0].trim().split(' ', 1)[0];
+             }
+
+             // Inline data URIs can be tens of kB: check the prefix (first char 'd' = 100) instead of scanning them
+             if (!src || (src.charCodeAt(0) === 100 && src.startsWith('data:image')) || src.includes('placeholder')) continue;
+
+             const srcLower = src.toLowerCase();
+             // Skip logos and icons
+             if (srcLower.includes('logo') || srcLower.includes('icon')) continue;
+             // Skip Shopify collection/category images (never size charts)
+             if (srcLower.includes('/collections/') || srcLower.includes('/collection/')) continue;
+
+             // Smart SVG filter: block icon-like SVGs, allow size-chart SVGs
+             if (srcLower.endsWith('.svg') || srcLower.includes('.svg?')) {
+                 const svgName = srcLower.split('/').pop().split('?')[0];
+                 if (!/size|chart|guide|measurement/i.test(svgName)) continue;
+             }
+
+             let score = containerBoost;
+             const alt = (img.alt || "").toLowerCase();
+
+             // Keyword matching
+             if (kwHit(srcLower) || kwHit(alt)) score += 30;
+             if (srcLower.includes('size') || srcLower.includes('chart') || srcLower.includes('guide')) score += 20;
+             if (srcLower.includes('measurement') || srcLower.includes('dimension')) score += 20;
+
+
+             // Size validation - more lenient
+             const naturalWidth = img.naturalWidth || img.width | 0;
+             const naturalHeight = img.naturalHeight || img.height | 0;
+             const hasSize = naturalWidth > 30 || naturalHeight > 30;
+
+             if (!seen.has(src)) {
+                 // ONLY include images with size-related keywords (score > 0)
+                 // Ignore generic product images with score 0
+                 if (score > 0) {
+                     srcs.push(src);
+                     scores.push(score);
+                     seen.add(src);
+                     log(`Image: ${src.substring(0, 60)}... Score: ${score} Size: ${naturalWidth}x${naturalHeight}`);
+                 } else {
+                     log(`Skipped (no size keywords, score=0): ${src.substring(0, 60)}...`);
+                 }
+             }
+        }
+
+        // Also check for iframes with size chart content
+        const iframes = bestContainer.querySelectorAll("iframe");
+        for (const iframe of iframes) {
+            try {
+                const iframeSrc = iframe.src || "";
+                if (keywords.test(iframeSrc)) {
+                    log(`Found size chart iframe: ${iframeSrc}`);
+                    srcs.push(iframeSrc);
+                    scores.push(50);
+                }
+            } catch(e) {}
+        }
+
+        // Limit to max 3 images to avoid returning too many
+        const finalImages = topByScore(srcs, scores, 3);
+
+        // If no images or tables found, try to extract text/HTML content
+        // ONLY for specific domains that use text-only size info (like dopamean.in)
+        let textHtml = null;
+        const textOnlyBrands = ['dopamean.in'];
+        const currentDomain = window.location.hostname.replace('www.', '');
+
+        if (finalImages.length === 0 && allTables.length === 0 && bestContainer && textOnlyBrands.includes(currentDomain)) {
+            // Check if container has meaningful text content with size keywords
+            const textContent = bestContainer.innerText || "";
+            log(`Text content length: ${textContent.length}, preview: ${textContent.substring(0, 80).replace(/\\n/g, ' ')}...`);
+
+            // More inclusive regex for size-related content
+            const sizeKeywords = /\\b(size|cm|inch|chest|waist|length|shoulder|sleeve|fit|measurements?|dimensions?|small|medium|large|xs|xl|xxl|armhole|bust|hip)\\b/i;
+            if (sizeKeywords.test(textContent) && textContent.length > 20 && textContent.length < 5000) {
+                // Clean and return the HTML
+                textHtml = bestContainer.innerHTML;
+                log(`Found text-based size info: ${textContent.substring(0, 100).replace(/\\n/g, ' ')}...`);
+            } else {
+                log(`Text does not match size keywords or length requirements`);
+            }
+        }
+
+        return { table: allTables.length ? allTables[0] : null, images: finalImages, textHtml: textHtml, logs: logs };
+    }
+"""
+
+# Page scripts by name; launch_context installs them all on window.__sc of every document
+PAGE_SCRIPTS = {
+    'detectType': DETECT_TYPE_JS,
+    'galleryImages': GALLERY_IMAGES_JS,
+    'interact': INTERACT_JS,
+    'loadAndExtractModal': LOAD_AND_MODAL_EXTRACT_JS,
+    'extractContainer': CONTAINER_EXTRACT_JS,
+}
+PAGE_SCRIPTS_INIT = "window.__sc = {" + ", ".join(f"{name}: ({src})" for name, src in PAGE_SCRIPTS.items()) + "};"
+PAGE_SCRIPT_MISSING = "__sc_missing__"
+CALL_PAGE_SCRIPT_JS = f"([name, arg, verbose]) => {{ window.__sc_verbose = verbose; return window.__sc ? window.__sc[name](arg) : '{PAGE_SCRIPT_MISSING}'; }}"
+
+async def run_page_script(page, name, arg=None, verbose=False):
+    """
+    Call a page script installed by PAGE_SCRIPTS_INIT, shipping its source only if the page lacks it.
+    The scripts only collect log lines when `verbose`, so quiet runs get empty logs back over CDP.
+    """
+    result = await page.evaluate(CALL_PAGE_SCRIPT_JS, [name, arg, verbose])
+    if result == PAGE_SCRIPT_MISSING:
+        result = await page.evaluate(PAGE_SCRIPTS[name], arg)
+    return result
+
+async def wait_for_first_match(page, selectors, timeout):
+    """Poll until one of `selectors` matches (returning it), or return None after `timeout` ms."""
+    try:
+        handle = await page.wait_for_function(FIRST_MATCH_JS, arg=selectors, timeout=timeout)
+        return await handle.json_value()
+    except PlaywrightError:
+        return None
+
+async def wait_for_popup_content(page, selector, timeout=1500):
+    """Give an opened popup until it shows a table, an image or some text, at most `timeout` ms."""
+    try:
+        await page.wait_for_function(POPUP_READY_JS, arg=selector, timeout=timeout)
+    except PlaywrightError:
+        pass
+
+class SizeChartScraper:
+    def __init__(self, url, headless=True, brand_cache=None, verbose=DEBUG):
+        self.url = url
+        self.headless = headless
+        self.verbose = verbose  # print the page scripts' step-by-step logs
+        self.user_data_dir = os.path.abspath("./user_data")
+        self.detected_type = None  # Will be set by detect_size_chart_type
+        self.domain = get_domain(url)
+        # Every scraper in the process shares one cache dict unless the caller passes its own
+        self.brand_cache = get_brand_cache() if brand_cache is None else brand_cache
+        self.brand_cache_dirty = False  # set when this run adds a detection; saved once at the end
+
+    async def detect_size_chart_type(self, page):
+        """Analyzes the page to detect what type of size chart implementation is used."""
+        result = await run_page_script(page, 'detectType')
         
-        print(f"\n=== SIZE CHART TYPE DETECTION ===")
-        for t in result['detectedTypes']:
-            print(f"  {t['type']}: confidence={t['confidence']}%")
-        print(f"  Primary: {result['primaryType']['type']}\n")
+        if self.verbose:
+            logger.info("\n=== SIZE CHART TYPE DETECTION ===\n" + "\n".join(
+                f"  {t['type']}: confidence={t['confidence']}%" for t in result['detectedTypes']))
+        logger.info(f"Size chart type: {result['primaryType']['type']}")
         
         self.detected_type = result['primaryType']['type']
         return result
 
     async def run(self):
         async with async_playwright() as p:
-            args = [
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-setuid-sandbox",
-                "--disable-infobars",
-                "--window-position=0,0",
-                "--ignore-certificate-errors",
-                "--ignore-certificate-errors-spki-list",
-                "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-            ]
-
-            print(f"Launching browser with user data: {self.user_data_dir}")
-            context = await p.chromium.launch_persistent_context(
-                self.user_data_dir,
-                headless=self.headless,
-                args=args,
-                viewport={"width": 1280, "height": 800},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-            )
-
-            page = context.pages[0] if context.pages else await context.new_page()
+            context = await launch_context(p, self.user_data_dir, self.headless)
+            try:
+                await self.run_on(context)
+            finally:
+                await context.close()
             
-            # Add stealth scripts
-            await page.add_init_script("""
-                Object.defineProperty(navigator, 'webdriver', {
-                    get: () => undefined
-                });
-            """)
-
-            print(f"Opening {self.url}...")
+            if self.brand_cache_dirty:
+                save_brand_cache(self.brand_cache)
+                self.brand_cache_dirty = False
+
+    def known_without_chart(self):
+        """True while the domain has a fresh 'NONE' cache entry; a stale one is dropped for re-detection."""
+        cached = self.brand_cache.get(self.domain)
+        if not cached or cached.get('type') != 'NONE':
+            return False
+        if time.time() - cached.get('ts', 0) < NO_CHART_TTL:
+            return True
+        del self.brand_cache[self.domain]
+        self.brand_cache_dirty = True
+        return False
+
+    def record_outcome(self, result):
+        """Count consecutive chart-less scrapes on this domain, turning it into a 'NONE' entry at NO_CHART_MISSES."""
+        cached = self.brand_cache.get(self.domain)
+        if cached is None:
+            return
+        if result['table'] or result['images'] or result.get('textHtml'):
+            if cached.pop('misses', None):
+                self.brand_cache_dirty = True
+            return
+        misses = cached.get('misses', 0) + 1
+        if misses >= NO_CHART_MISSES:
+            self.brand_cache[self.domain] = {'type': 'NONE', 'ts': time.time()}
+            logger.info(f"  [CACHE] {self.domain} has no size chart ({misses} misses), skipping it for now")
+        else:
+            cached['misses'] = misses
+        self.brand_cache_dirty = True
+
+    async def run_on(self, context):
+        """Scrape self.url in a new page of an already-open context and return the result dict."""
+        if self.known_without_chart():
+            logger.info(f"Skipping {self.url}: {self.domain} is cached as having no size chart")
+            result = {'table': None, 'images': [], 'textHtml': None}
+            self.print_result(result)
+            return result
+        
+        page = await context.new_page()
+        try:
+            logger.info(f"Opening {self.url}...")
+            loaded = True
             try:
                 await page.goto(self.url, wait_until="domcontentloaded", timeout=60000)
             except Exception as e:
-                print(f"Error loading page: {e}")
-                
-            # Allow some dynamic content to hydrate
-            await page.wait_for_timeout(2000)
-
+                logger.info(f"Error loading page: {e}")
+                loaded = False
+            
             # 0. DETECT SIZE CHART TYPE (with caching)
             if self.domain in self.brand_cache:
                 # Use cached type - FAST PATH
+                # The triggers still need to hydrate, but stop waiting as soon as the network is quiet
+                try:
+                    await page.wait_for_load_state("networkidle", timeout=1500)
+                except PlaywrightError:
+                    pass
                 cached = self.brand_cache[self.domain]
+                touch_brand(self.brand_cache, self.domain)
                 self.detected_type = cached['type']
-                print(f"\n=== USING CACHED TYPE ===")
-                print(f"  Domain: {self.domain}")
-                print(f"  Type: {self.detected_type} (cached)")
-                print(f"  Original confidence: {cached.get('confidence', 'N/A')}%\n")
+                logger.info(f"\n=== USING CACHED TYPE ===")
+                logger.info(f"  Domain: {self.domain}")
+                logger.info(f"  Type: {self.detected_type} (cached)")
+                logger.info(f"  Original confidence: {cached.get('confidence', 'N/A')}%\n")
             else:
                 # Detect and cache - SLOW PATH (first time only)
+                # Allow some dynamic content to hydrate before detection
+                await page.wait_for_timeout(2000)
                 detection = await self.detect_size_chart_type(page)
-                
+            
                 # Save to cache for future use
                 self.brand_cache[self.domain] = {
                     'type': self.detected_type,
                     'confidence': detection['primaryType'].get('confidence', 0),
                     'selector': detection['primaryType'].get('selector', None)
                 }
-                save_brand_cache(self.brand_cache)
-                print(f"  [CACHE] Saved to cache: {self.domain} -> {self.detected_type}")
+                self.brand_cache_dirty = True
+                logger.info(f"  [CACHE] Cached: {self.domain} -> {self.detected_type}")
 
             # 1. INTERACTION: Find and Click Triggers (type-aware)
             navigated_away = await self.interact_with_triggers(page)
+        
+            cached_popup = self.brand_cache[self.domain].get('popup_selector')
+            if cached_popup:
+                # This domain's popup is already known: wait for exactly that instead of searching
+                try:
+                    await page.wait_for_selector(cached_popup, state='visible', timeout=3000)
+                    logger.info(f"Cached popup: {cached_popup} appeared")
+                    await wait_for_popup_content(page, cached_popup)
+                except PlaywrightError:
+                    # Stale (theme changed or never really the popup): forget it and search again
+                    logger.info(f"Cached popup: {cached_popup} did not appear, clearing it")
+                    self.brand_cache[self.domain].pop('popup_selector', None)
+                    self.brand_cache_dirty = True
+                    cached_popup = None
+            if not cached_popup:
+                found_popup = None
+                popup_visible = False
+                popup_selector = POPUP_SELECTOR_BY_TYPE.get(self.detected_type)
             
-            # Wait for popups/modals to appear - use type-specific wait
-            await page.wait_for_timeout(2000)
+                # Wait for popups/modals to appear: returns as soon as any candidate is in the DOM
+                candidates = ([popup_selector] if popup_selector else []) + POPUP_SELECTORS
+                selector = await wait_for_first_match(page, candidates, 3000)
             
-            # Type-specific post-interaction wait
-            popup_selector = None
-            if self.detected_type == 'MODAL_ILMS':
-                popup_selector = '.ilmsc-modal'
-            elif self.detected_type == 'MODAL_MFP':
-                popup_selector = '.mfp-content'
-            elif self.detected_type == 'MODAL_PSWP':
-                popup_selector = '.pswp--open'
-            elif self.detected_type == 'MODAL_BOOTSTRAP':
-                popup_selector = '.modal.show'
-            elif self.detected_type == 'MODAL_KIWI':
-                popup_selector = '.kiwi-sizing-modal, .ks-chart-container, .ks-modal-content'
-            elif self.detected_type == 'MODAL_SCR':
-                popup_selector = '.scr-modal'
-            elif self.detected_type == 'MODAL_AVADA':
-                popup_selector = '#avada-modal-content, .Avada-Modal__ContainerWrapper'
-            elif self.detected_type == 'ACCORDION':
-                popup_selector = 'details[open]'
-            elif self.detected_type == 'TAB':
-                popup_selector = '[role="tabpanel"]'
+                # Type-specific post-interaction wait: long only when some popup is already in the DOM
+                if popup_selector:
+                    try:
+                        await page.wait_for_selector(popup_selector, state='visible', timeout=8000 if selector else 1500)
+                        logger.info(f"Type-specific wait: {popup_selector} appeared")
+                        found_popup = popup_selector
+                        popup_visible = True
+                    except PlaywrightError:
+                        logger.info(f"Type-specific wait: {popup_selector} did not appear")
             
-            if popup_selector:
-                try:
-                    await page.wait_for_selector(popup_selector, state='visible', timeout=8000)
-                    print(f"Type-specific wait: {popup_selector} appeared")
-                    await page.wait_for_timeout(1000)
-                except:
-                    print(f"Type-specific wait: {popup_selector} did not appear")
+                # Fallback: whichever common popup selector showed up
+                if selector and not found_popup:
+                    logger.info(f"Detected popup: {selector}")
+                    found_popup = selector
+                    # FIRST_MATCH_JS only checks presence (.modal-open sits on <body>), so check it's shown
+                    popup_visible = await page.is_visible(selector)
             
-            # Fallback: Try common popup selectors
-            popup_selectors = [
-                ".mfp-content", ".ilmsc-modal", ".pswp--open", ".modal.show",
-                ".scr-modal", "[class*='sizechart']", ".size-guide-modal", ".popup-content",
-                ".drawer.is-active", ".modal-open", "[aria-modal='true']",
-                "#avada-modal-content", ".Avada-Modal__ContainerWrapper"
-            ]
-            for selector in popup_selectors:
-                try:
-                    if await page.query_selector(selector):
-                        print(f"Detected popup: {selector}")
-                        await page.wait_for_timeout(1500)
-                        break
-                except:
-                    pass
+                if found_popup:
+                    await wait_for_popup_content(page, found_popup)
+            
+                # Remember which popup showed up so the next page on this domain skips the search
+                if found_popup and popup_visible:
+                    self.brand_cache[self.domain]['popup_selector'] = found_popup
+                    self.brand_cache_dirty = True
 
             # 2. DETECTION & EXTRACTION
             # If navigation occurred, skip DOM extraction and use gallery fallback
             if navigated_away:
-                print("Navigation detected - skipping DOM extraction, using gallery fallback only")
+                logger.info("Navigation detected - skipping DOM extraction, using gallery fallback only")
                 result = {'table': None, 'images': [], 'textHtml': None}
             else:
                 result = await self.extract_content(page)
-            
+        
             # 3. FALLBACK: Check product gallery images for size chart URLs
             # This catches brands like adlt.in where size chart is in product gallery
             if not result['table'] and not result['images'] and not result.get('textHtml'):
-                print("No size chart in DOM. Checking product gallery images...")
-                gallery_images = await page.evaluate("""
-                    () => {
-                        const sizeRegex = /size[_-]?(chart|guide)|measurement|sizing/i;
-                        const uniqueImages = new Set();
-                        
-                        // Helper to clean URL (remove query params and normalize protocol)
-                        const cleanUrl = (url) => {
-                            try {
-                                let clean = url.split('?')[0];
-                                if (clean.startsWith('//')) {
-                                    clean = 'https:' + clean;
-                                }
-                                return clean;
-                            } catch (e) {
-                                return url;
-                            }
-                        };
-                        
-                        // Check main product gallery images
-                        const galleryImgs = document.querySelectorAll(
-                            '.product-media img, .product__media img, .product-single__media img, ' +
-                            '.product-image-gallery img, .product-gallery img, [data-product-media] img, ' +
-                            '.product__slides img, .slick-slide img, .swiper-slide img'
-                        );
-                        
-                        for (const img of galleryImgs) {
-                            const src = img.src || img.dataset?.src || '';
-                            if (sizeRegex.test(src)) {
-                                uniqueImages.add(cleanUrl(src));
-                            }
-                        }
-                        
-                        // Also check all srcset/data-srcset for size chart images
-                        const allImgs = document.querySelectorAll('img[srcset], img[data-srcset]');
-                        for (const img of allImgs) {
-                            const srcset = img.srcset || img.dataset?.srcset || '';
-                            if (sizeRegex.test(srcset)) {
-                                // Extract highest quality URL from srcset
-                                const match = srcset.split(',').pop().trim().split(' ')[0];
-                                if (match) {
-                                    uniqueImages.add(cleanUrl(match));
-                                }
-                            }
-                        }
-                        
-                        return Array.from(uniqueImages);
-                    }
-                """)
-                
+                logger.info("No size chart in DOM. Checking product gallery images...")
+                gallery_images = await run_page_script(page, 'galleryImages')
+            
                 if gallery_images:
-                    print(f"  Found {len(gallery_images)} size chart image(s) in product gallery!")
+                    logger.info(f"  Found {len(gallery_images)} size chart image(s) in product gallery!")
                     for img in gallery_images:
-                        print(f"    - {img[:80]}...")
+                        logger.info(f"    - {img[:80]}...")
                     result['images'] = gallery_images[:3]  # Limit to 3
                 else:
-                    print("No size chart found in product gallery either.")
+                    logger.info("No size chart found in product gallery either.")
 
+            # Pages that failed to load or navigated away say nothing about the domain
+            if loaded and not navigated_away:
+                self.record_outcome(result)
             self.print_result(result)
-            await context.close()
+            return result
+        finally:
+            await page.close()
 
     async def interact_with_triggers(self, page):
         """Finds and clicks potential size chart triggers."""
-        selector = "button, a, span, div, summary, .size-guide, .size-chart, .sizelink, .mfp, collapsible-row"
-        
-        logs = await page.evaluate("""
-            (selector) => {
-                const logs = [];
-                function log(msg) { logs.push(msg); }
-                
-                log("Starting interactions...");
-                // Primary keywords - specific size chart terms
-                const primaryKeywords = /size[\\s_-]*(chart|guide|help|specs|match|recommendation|link)|measurements|dimensions|sizing[\\s_-]*(chart|guide)|body[\\s_-]*(chart|guide)|find\\s*my\\s*size|sizelink/i;
-                
-                // Secondary keywords - standalone 'size' for accordion titles (must be short text)
-                const accordionKeywords = /^size$/i;
-                
-                const elements = Array.from(document.querySelectorAll(selector));
-                log(`Found ${elements.length} candidate elements.`);
-                
-                // Debug implicit .sizelink
-                const sl = document.querySelector('.sizelink');
-                if (sl) log(`[DEBUG] .sizelink found. Text: "${sl.textContent}" InnerText: "${sl.innerText}" Class: "${sl.className}"`);
-                
-                function isClickable(el) {
-                    const style = window.getComputedStyle(el);
-                    const rect = el.getBoundingClientRect();
-                    const visible = (rect.width > 0 || rect.height > 0 || el.getClientRects().length > 0) && style.visibility !== 'hidden';
-                    return visible;
-                }
-
-                for (const el of elements) {
-                    let textToCheck = "";
-                    if (el.tagName.toLowerCase() === 'collapsible-row') {
-                         const label = el.querySelector('[slot="heading"], summary, .accordion__title');
-                         textToCheck = label ? label.textContent : el.textContent;
-                    } else {
-                         // Use innerText to ignore hidden spacing, and trim first
-                         textToCheck = (el.innerText || el.textContent || "").trim();
-                         if (textToCheck.length > 100) continue; 
-                    }
-                    textToCheck = (textToCheck || "").trim();
-                    
-                    // Explicit validation to avoid "Sizing is actually accurate"
-                    if (/actually\\s*accurate/i.test(textToCheck)) {
-                        if (textToCheck.toLowerCase().includes("size")) log(`[SKIP] Excluded phrase: "${textToCheck}"`);
-                        continue;
-                    }
-                    
-                    // Check for accordion elements (SUMMARY, DETAILS) - allow standalone "size"
-                    const isAccordion = ['summary', 'details'].includes(el.tagName.toLowerCase()) || 
-                                       el.closest('details') !== null ||
-                                       el.classList.contains('accordion__title') ||
-                                       el.classList.contains('summary__title');
-                    
-                    let match = (textToCheck && primaryKeywords.test(textToCheck)) ||
-                                (el.title && primaryKeywords.test(el.title)) ||
-                                (el.className && typeof el.className === 'string' && primaryKeywords.test(el.className));
-                    
-                    // For accordion elements, also match standalone "size"
-                    if (!match && isAccordion && accordionKeywords.test(textToCheck)) {
-                        match = true;
-                        log(`[ACCORDION MATCH] Standalone 'size' in ${el.tagName}`);
-                    }
-                    
-                    if (!match && (textToCheck.toLowerCase().includes("size") || textToCheck.toLowerCase().includes("chart"))) {
-                         log(`[MISS] Text "${textToCheck}" did not match regex. Tag: ${el.tagName}`);
-                    }
-
-                    if (match) {
-                        const clickable = isClickable(el);
-                        log(`Match: <${el.tagName}> "${textToCheck}" Class: "${el.className}" Clickable: ${clickable}`);
-                        
-                        if (clickable) {
-                            el.setAttribute("data-sc-trigger", "true");
-                            log(`[ACTION] Clicking trigger: <${el.tagName}>`);
-
-                            if (el.tagName.toLowerCase() === 'collapsible-row') {
-                                const summary = el.querySelector('summary, button');
-                                if (summary) summary.click();
-                                el.setAttribute("data-sc-priority", "true");
-                            } else if (el.tagName.toLowerCase() === 'summary') {
-                                // Handle summary inside details - expand the details
-                                try { el.click(); } catch(e) { log(`Click error: ${e}`); }
-                                const parentDetails = el.closest('details');
-                                if (parentDetails) {
-                                    parentDetails.setAttribute('open', 'true');
-                                    parentDetails.setAttribute("data-sc-priority", "true");
-                                    log(`[ACCORDION] Opened details element`);
-                                }
-                            } else if (el.tagName.toLowerCase() === 'details') {
-                                // Directly clicked on details - open it
-                                el.setAttribute('open', 'true');
-                                el.setAttribute("data-sc-priority", "true");
-                                const summary = el.querySelector('summary');
-                                if (summary) summary.click();
-                                log(`[ACCORDION] Opened details element directly`);
-                            } else {
-                                // Check for aria-controls or data-target to identify specific modal
-                                const targetId = el.getAttribute('aria-controls') || el.getAttribute('data-target') || el.getAttribute('href');
-                                if (targetId) {
-                                    const cleanId = targetId.replace('#', '');
-                                    window._sc_target_modal_id = cleanId;
-                                    log(`[TARGET] Set target modal ID to: ${cleanId}`);
-                                }
-
-                                try { el.click(); } catch(e) { log(`Click error: ${e}`); }
-                                
-                                // Check for MFP (Magnific Popup)
-                                if (el.className.includes('mfp') || el.className.includes('sizelink')) {
-                                    log("[DEBUG] Clicked MFP trigger, setting flag...");
-                                    window._sc_mfp_clicked = true;
-                                }
-                                
-                                // Propagate priority
-                                let p = el.parentElement;
-                                while(p && p !== document.body) {
-                                    const t = p.tagName.toLowerCase();
-                                    const c = (p.className || "").toString();
-                                    if (t === 'details' || t === 'dialog' || c.includes('modal') || c.includes('popup') || c.includes('drawer')) {
-                                        p.setAttribute("data-sc-priority", "true");
-                                        if (t === 'details') p.setAttribute('open', 'true');
-                                        break;
-                                    }
-                                    p = p.parentElement;
-                                }
-                            }
-                        }
-                    }
-                }
-                return logs;
-            }
-        """, selector)
+        logs = await run_page_script(page, 'interact', [TRIGGER_SELECTOR, TRIGGER_FALLBACK_SELECTOR], self.verbose)
         
-        for msg in logs:
-            print(f"INTERACTION LOG: {msg}")
+        print_logs("INTERACTION LOG", logs, self.verbose)
 
         # Post-interaction wait for MFP - wrapped in try-except to handle navigation
         try:
             is_mfp = await page.evaluate("() => window._sc_mfp_clicked === true")
             if is_mfp:
-                print("MFP Trigger clicked. Waiting for .mfp-content specifically...")
+                logger.info("MFP Trigger clicked. Waiting for .mfp-content specifically...")
                 try:
                     await page.wait_for_selector(".mfp-content", timeout=5000)
-                    print("MFP Content appeared!")
-                    await page.wait_for_timeout(2000)
-                except:
-                    print("MFP Content did not appear within timeout.")
+                    logger.info("MFP Content appeared!")
+                    await wait_for_popup_content(page, ".mfp-content", timeout=2000)
+                except PlaywrightTimeoutError:
+                    logger.info("MFP Content did not appear within timeout.")
             return False  # No navigation occurred
         except Exception as e:
             # Navigation may have occurred (e.g., clicking a link that goes to size guide page)
             if "destroyed" in str(e) or "navigation" in str(e).lower():
-                print("INTERACTION LOG: Page navigated after click - going back to product page")
+                logger.info("INTERACTION LOG: Page navigated after click - going back to product page")
                 try:
                     await page.go_back()
                     await page.wait_for_load_state("domcontentloaded")
                     await page.wait_for_timeout(2000)
-                    print("INTERACTION LOG: Returned to product page - will use gallery fallback")
-                except:
-                    print("INTERACTION LOG: Could not go back - will try gallery fallback anyway")
+                    logger.info("INTERACTION LOG: Returned to product page - will use gallery fallback")
+                except PlaywrightError:
+                    logger.info("INTERACTION LOG: Could not go back - will try gallery fallback anyway")
                 return True  # Navigation occurred, use gallery fallback
             return False
 
     async def extract_content(self, page):
         """Identifies best container and extracts images/tables."""
         
-        # First, force lazy-loaded images to load
-        await page.evaluate("""
-            () => {
-                // Force lazy images to load
-                document.querySelectorAll('img[data-src], img[data-srcset], img[loading="lazy"]').forEach(img => {
-                    if (img.dataset.src) img.src = img.dataset.src;
-                    if (img.dataset.srcset) img.srcset = img.dataset.srcset;
-                    img.loading = 'eager';
-                });
-                // Also check for noscript images (common lazy pattern)
-                document.querySelectorAll('noscript').forEach(ns => {
-                    const match = ns.innerHTML.match(/src=["']([^"']+)["']/);
-                    if (match && ns.previousElementSibling?.tagName === 'IMG') {
-                        ns.previousElementSibling.src = match[1];
-                    }
-                });
-            }
-        """)
+        # Force lazy-loaded images to load, wait for them in the page, then
+        # MODAL-FIRST EXTRACTION: check known modal selectors first (one round-trip)
+        modal_result = await run_page_script(page, 'loadAndExtractModal', verbose=self.verbose)
         
-        # Wait for images to load
-        await page.wait_for_timeout(1500)
-        
-        # MODAL-FIRST EXTRACTION: Check known modal selectors first
-        modal_result = await page.evaluate("""
-            () => {
-                const logs = [];
-                function log(msg) { logs.push(msg); }
-                const keywords = /size\\s*(chart|guide|help|specs|match|recommendation|link)|measurements|dimensions|sizing|t-shirt|womens|mens/i;
-                
-                // Priority modal selectors - extract directly from these if they exist and are visible
-                const modalSelectors = [
-                    // SCR Size Chart app modals
-                    '.scr-modal', '[class*="scr-modal"]',
-                    // JSC Size Chart app modals
-                    '.jsc-modal', '.jsc-modal-body', '.jsc-modal-content', '.jsc-size-chart-modal',
-                    '[class*="jsc-"]',
-                    // Kiwi Sizing Modals
-                    '.kiwi-sizing-modal', '.ks-chart-container', '.ks-modal-content', '[id*="kiwi-sizing"]',
-                    // Avada Theme Modals
-                    '#avada-modal-content', '.Avada-Modal__ContainerWrapper', '[class*="Avada-Modal"]',
-                    // Other size chart modals
-                    '.ilmsc-modal', '.ilmsc-modal-content', '.ilmsc-content', '.sizechart-container',
-                    '.mfp-content', '.mfp-container', 
-                    '.pswp--open .pswp__scroll-wrap', '.pswp__container', '.pswp__item',
-                    '[class*="sizechart-modal"]', '[class*="size-chart-modal"]',
-                    '.modal.show .modal-body', '.drawer.is-active', '[aria-modal="true"]'
-                ];
-                
-                let modalContainer = null;
-                const modalTargetId = window._sc_target_modal_id;
-                
-                // 1. Try to find modal by target ID if available
-                if (modalTargetId) {
-                    log(`[TARGET] Looking for modal with ID: ${modalTargetId}`);
-                    modalContainer = document.getElementById(modalTargetId);
-                    if (!modalContainer) {
-                        // Sometimes the ID is on a child div or parent wrapped in a dialog
-                        modalContainer = document.querySelector(`[id*="${modalTargetId}"]`);
-                    }
-                }
-                
-                // 2. Fallback to generic search if no target ID or target not found
-                if (!modalContainer) {
-                    log(`[SEARCH] Searching for active modal (no target ID match)...`);
-                    
-                    // Collect all potential candidates
-                    const candidates = Array.from(document.querySelectorAll(
-                        '.product-popup-modal__content, .product-popup-modal, ' +
-                        '[aria-modal="true"][role="dialog"], ' +
-                        '.is-open[role="dialog"], .modal.open, .fancybox-content, ' +
-                        '.scr-modal, [class*="scr-modal"], ' +
-                        '#avada-modal-content, .Avada-Modal__ContainerWrapper, [class*="Avada-Modal"], ' +
-                        '.ilmsc-modal, .ilmsc-modal-content, [class*="ilmsc"], ' +
-                        '[class*="sizechart-modal"], [class*="size-chart-modal"], [class*="sizechart"], ' +
-                        '.drawer__content, .drawer, [class*="drawer"]'
-                    ));
-                    
-                    let bestCandidate = null;
-                    let bestScore = -1;
-                    
-                    for (const cand of candidates) {
-                        if (cand.offsetWidth < 10 && cand.offsetHeight < 10) continue; // Skip invisible
-                        
-                        let score = 0;
-                        const id = (cand.id || "").toLowerCase();
-                        const cls = (cand.className || "").toLowerCase();
-                        const text = (cand.innerText || "").substring(0, 500).toLowerCase();
-                        
-                        // Scoring rules
-                        if (id.includes('size') || id.includes('guide') || id.includes('chart')) score += 50;
-                        if (cls.includes('size') || cls.includes('guide')) score += 30;
-                        if (text.includes('size chart') || text.includes('size guide') || text.includes('measurement')) score += 20;
-                        if (cand.querySelector('table')) score += 40;
-                        
-                        // SCR Size Chart app - high priority modal
-                        if (cls.includes('scr-modal')) score += 80;
-                        // Avada Theme modals - high priority
-                        if (cls.includes('avada-modal') || id.includes('avada-modal')) score += 80;
-                        
-                        // Penalize inline containers that are just triggers/wrappers (not actual content holders)
-                        // These often match sizechart-related classes but contain no content themselves
-                        if (cls.includes('sizechart-inline') || cls.includes('best-fit-size')) {
-                            const hasContent = cand.querySelector('table, img');
-                            if (!hasContent) score -= 30;
-                        }
-                        
-                        // Negative scoring for common non-size popups
-                        if (id.includes('newsletter') || cls.includes('newsletter')) score -= 50;
-                        if (text.includes('subscribe') && text.includes('newsletter')) score -= 30;
-                        if (id.includes('cart') || cls.includes('cart')) score -= 50;
-                        if (text.includes('your cart is empty')) score -= 50;
-                        
-                        log(`[CANDIDATE] Tag: ${cand.tagName} ID: ${cand.id} Class: ${cand.className.substring(0,30)} Score: ${score}`);
-                        
-                        if (score > bestScore) {
-                            bestScore = score;
-                            bestCandidate = cand;
-                        }
-                    }
-                    
-                    // Only use result if score is reasonable, or if we have no other option but it's a standard modal
-                    if (bestCandidate && bestScore > -20) {
-                        modalContainer = bestCandidate;
-                        log(`[SELECTED] Best candidate score: ${bestScore}`);
-                    }
-                }
-                
-                // 3. Last resort: specific original list if above logic failed completely
-                if (!modalContainer) {
-                    for (const sel of modalSelectors) {
-                        const el = document.querySelector(sel);
-                        // Check for visibility and size to ensure it's an active modal
-                        if (el && (el.offsetWidth > 100 || el.offsetHeight > 100)) {
-                            log(`Found active modal via generic selector: ${sel}`);
-                            modalContainer = el;
-                            break;
-                        }
-                    }
-                }
-
-                if (!modalContainer) {
-                    log("No active modal found, will use general extraction.");
-                    return { table: null, images: [], logs: logs, foundModal: false };
-                }
-                
-                // For JSC modals, prefer the body-wrapper for content extraction
-                const jscBody = modalContainer.querySelector('.jsc-modal-body-wrapper, .jsc-modal-body, .jsc-modal-content');
-                if (jscBody) {
-                    log(`Using JSC body container: ${jscBody.className?.substring?.(0, 50)}`);
-                    modalContainer = jscBody;
-                }
-                
-                // For ILMS modals, prefer the content/body container to avoid header/footer noise
-                const ilmsBody = modalContainer.querySelector('.ilmsc-modal-content, .ilmsc-body, .ilmsc-content');
-                if (ilmsBody) {
-                    log(`Using ILMS body container: ${ilmsBody.className?.substring?.(0, 50)}`);
-                    modalContainer = ilmsBody;
-                }
-
-                // For Kiwi Sizing modals, prefer the chart container
-                const kiwiBody = modalContainer.querySelector('.ks-chart-container, .kiwi-sizing-modal-inner, .ks-modal-content');
-                if (kiwiBody) {
-                    log(`Using Kiwi body container: ${kiwiBody.className?.substring?.(0, 50)}`);
-                    modalContainer = kiwiBody;
-                }
-                
-                log(`Extracting from modal container: ${modalContainer.className?.substring?.(0, 50)}`);
-                
-                // Extract images from modal
-                const imgs = Array.from(modalContainer.querySelectorAll("img"));
-                log(`Found ${imgs.length} images in modal.`);
-                
-                const validImages = [];
-                const seen = new Set();
-                
-                for (const img of imgs) {
-                    let src = img.src || img.dataset?.src || "";
-                    if (!src || src.includes('data:image') || src.includes('placeholder')) continue;
-                    
-                    const srcLowerM = src.toLowerCase();
-                    // Skip logos and icons
-                    if (srcLowerM.includes('logo') || srcLowerM.includes('icon')) continue;
-                    // Skip Shopify collection/category images (never size charts)
-                    if (srcLowerM.includes('/collections/') || srcLowerM.includes('/collection/')) continue;
-                    
-                    // Smart SVG filter: block icon-like SVGs, allow size-chart SVGs
-                    if (srcLowerM.endsWith('.svg') || srcLowerM.includes('.svg?')) {
-                        const svgName = srcLowerM.split('/').pop().split('?')[0];
-                        if (!/size|chart|guide|measurement/i.test(svgName)) continue;
-                    }
-                    
-                    let score = 0;
-                    const srcLower = src.toLowerCase();
-                    const alt = (img.alt || "").toLowerCase();
-                    
-                    if (keywords.test(srcLower) || keywords.test(alt)) score += 50;
-                    if (srcLower.includes('sizeguide') || srcLower.includes('size_guide') || srcLower.includes('size-chart')) score += 40;
-                    if (srcLower.includes('chart') || srcLower.includes('measurement')) score += 30; 
-                    
-                    const naturalWidth = img.naturalWidth || parseInt(img.width) || 0;
-                    const naturalHeight = img.naturalHeight || parseInt(img.height) || 0;
-                    
-                    // INSIDE A SIZE CHART MODAL: Accept all images since the modal already confirms it's size chart context
-                    // Only skip very small images (icons, etc)
-                    if (!seen.has(src) && (naturalWidth > 50 || naturalHeight > 50 || score > 0)) {
-                        validImages.push({ src, score: score || 10, w: naturalWidth, h: naturalHeight });
-                        seen.add(src);
-                        log(`Modal image: ${src.substring(0, 60)}... Score: ${score || 10} Size: ${naturalWidth}x${naturalHeight}`);
-                    } else if (!seen.has(src)) {
-                        log(`Modal skipped (too small): ${src.substring(0, 60)}...`);
-                    }
-                }
-                
-                // Extract tables from modal
-                const tables = Array.from(modalContainer.querySelectorAll("table"));
-                log(`Found ${tables.length} tables in modal.`);
-                let allTables = [];
-                for (const table of tables) {
-                    const rows = Array.from(table.rows).map(row => 
-                        Array.from(row.cells).map(cell => {
-                            // Try multiple ways to get text
-                            let text = cell.innerText.trim();
-                            if (!text) text = cell.textContent.trim();
-                            // Handle inputs in cells
-                            if (!text) {
-                                const input = cell.querySelector('input');
-                                if (input) text = input.value || input.placeholder || "";
-                            }
-                            return text;
-                        })
-                    );
-                    if (rows.length > 0 && rows[0].length > 0) {
-                        log(`Table with ${rows.length} rows, ${rows[0].length} cols`);
-                        allTables.push(rows);
-                    }
-                }
-                
-                // Also try to find div-based size charts (common in JSC apps)
-                if (allTables.length === 0) {
-                    const sizeRows = modalContainer.querySelectorAll('[class*="size-row"], [class*="jsc-row"], .jsc-table-row');
-                    if (sizeRows.length > 0) {
-                        log(`Found ${sizeRows.length} div-based size rows`);
-                    }
-                }
-                
-                validImages.sort((a,b) => b.score - a.score);
-                // Limit to max 3 images
-                const topImages = validImages.slice(0, 3);
-                return { 
-                    table: allTables.length ? allTables[0] : null, 
-                    images: topImages.map(i => i.src), 
-                    logs: logs, 
-                    foundModal: true 
-                };
-            }
-        """)
-        
-        for msg in modal_result.get('logs', []):
-            print(f"MODAL EXTRACT LOG: {msg}")
+        print_logs("MODAL EXTRACT LOG", modal_result.get('logs'), self.verbose)
         
         # If modal extraction succeeded, use its results
         if modal_result.get('foundModal') and (modal_result.get('images') or modal_result.get('table')):
-            print(f"Using modal extraction: {len(modal_result.get('images', []))} images, {1 if modal_result.get('table') else 0} table")
+            logger.info(f"Using modal extraction: {len(modal_result.get('images', []))} images, {1 if modal_result.get('table') else 0} table")
             return modal_result
         
         # Fall back to general container extraction
-        result = await page.evaluate("""
-            async () => {
-                const logs = [];
-                function log(msg) { logs.push(msg); }
-                const keywords = /size\\s*(chart|guide|help|specs|match|recommendation|link)|measurements|dimensions|sizing\\s*(chart|guide)|body\\s*(chart|guide)|find\\s*my\\s*size|sizelink|sizechart/i;
-                
-                function isVisible(el) {
-                    const style = window.getComputedStyle(el);
-                    return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length) && style.display !== 'none' && style.visibility !== 'hidden';
-                }
-
-                function getScore(el) {
-                    let score = 0;
-                    const cls = (el.className || "").toString().toLowerCase();
-                    const id = (el.id || "").toLowerCase();
-                    const text = (el.innerText || "").toLowerCase();
-                    const tag = el.tagName.toLowerCase();
-                    
-                    // Penalize buttons/links as containers - they're triggers, not content
-                    if (tag === 'button' || tag === 'a') score -= 100;
-                    
-                    // HIGH PRIORITY: Explicit size chart containers (inline charts)
-                    // These should almost always win over generic sections
-                    if (cls.includes("ai-size-chart") || cls.includes("ai_size_chart")) score += 200;
-                    if (/size-chart|sizechart|size_chart/i.test(cls) && !cls.includes('button') && !cls.includes('btn')) score += 150;
-                    if (/size-chart|sizechart|size_chart/i.test(id)) score += 150;
-                    
-                    // Prioritize actual popup/modal containers
-                    if (cls.includes("pswp") || cls.includes("photoswipe")) score += 80;
-                    if (cls.includes("mfp-content") || cls.includes("mfp-wrap")) score += 70;
-                    if (cls.includes("modal-content") || cls.includes("modal-body")) score += 60;
-                    if (cls.includes("ilmsc-modal") || cls.includes("ilmsc-content")) score += 80;
-                    if (cls.includes("avada-modal") || id.includes("avada-modal")) score += 80;
-                    
-                    if (el.hasAttribute("data-sc-priority")) score += 50;
-                    if (el.hasAttribute("data-sc-trigger")) score -= 20; // Triggers are not content
-
-                    // Class-based scoring for other size-related elements
-                    if (cls.includes("sizechart-container") || cls.includes("size-chart-content")) score += 60;
-                    if (cls.includes("size") && (cls.includes("chart") || cls.includes("guide"))) score += 30;
-                    if (cls.includes("ilm-sizechart") || cls.includes("ilmsc")) score += 50;
-                    
-                    // Tables in size chart containers are very valuable
-                    const tables = el.querySelectorAll("table");
-                    if (tables.length > 0) {
-                        // Check if table looks like a size chart (has size-related headers)
-                        for (const table of tables) {
-                            const headerText = (table.rows[0]?.innerText || "").toLowerCase();
-                            if (/size|chest|waist|length|width|measurement/i.test(headerText)) {
-                                score += 80; // Size table - very high priority
-                            } else {
-                                score += 25; // Generic table
-                            }
-                        }
-                    }
-                    
-                    // Images with size-related names - boost only for relevant images
-                    const imgs = el.querySelectorAll("img");
-                    let sizeRelevantImages = 0;
-                    for (const img of imgs) {
-                        const src = (img.src || img.dataset?.src || "").toLowerCase();
-                        const alt = (img.alt || "").toLowerCase();
-                        if (keywords.test(src) || keywords.test(alt)) {
-                            score += 40;
-                            sizeRelevantImages++;
-                        }
-                    }
-                    
-                    // Penalize containers with many generic images (likely product galleries)
-                    if (imgs.length > 5 && sizeRelevantImages === 0) score -= 50;
-                    
-                    // Text content boost - but only if not too large (avoid body elements)
-                    if (text.length < 5000 && keywords.test(text.substring(0, 300))) score += 15;
-                    
-                    // Size penalty for very small elements
-                    const rect = el.getBoundingClientRect();
-                    if (rect.width < 50 || rect.height < 50) score -= 30;
-                    
-                    return score;
-                }
-
-                // Extended selector list
-                const candidates = Array.from(document.querySelectorAll(`
-                    div, section, modal-dialog, details, 
-                    .product-popup, [data-sc-priority], .mfp-content, 
-                    .product-block, .product__info-container,
-                    [class*="sizechart"], [class*="size-chart"], [class*="ilm"],
-                    .modal-content, .drawer, .popup-content
-                `));
-                
-                let bestContainer = null;
-                let maxScore = -1;
-
-                for (const cand of candidates) {
-                    if (!isVisible(cand)) continue;
-                    const score = getScore(cand);
-                    if (score > 15) log(`Candidate <${cand.tagName}> .${cand.className?.substring?.(0, 50)} Score: ${score}`);
-                    if (score > maxScore) {
-                        maxScore = score;
-                        bestContainer = cand;
-                    }
-                }
-                
-                if (!bestContainer || maxScore < 10) {
-                    log("No best container found.");
-                    return { table: null, images: [], logs: logs };
-                }
-                
-                log(`Best Container: <${bestContainer.tagName}> .${bestContainer.className?.substring?.(0, 50)} Score: ${maxScore}`);
-
-                // Extract Tables
-                let tables = Array.from(bestContainer.querySelectorAll("table"));
-                let allTables = [];
-                for (const table of tables) {
-                    const rows = Array.from(table.rows).map(row => 
-                        Array.from(row.cells).map(cell => {
-                            // Try multiple ways to get text
-                            let text = cell.innerText.trim();
-                            if (!text) text = cell.textContent.trim();
-                            // Handle inputs in cells
-                            if (!text) {
-                                const input = cell.querySelector('input');
-                                if (input) text = input.value || input.placeholder || "";
-                            }
-                            return text;
-                        })
-                    );
-                    if (rows.length > 0 && rows[0].length > 0) {
-                        allTables.push(rows);
-                    }
-                }
-                
-                // Extract Images - comprehensive approach
-                const allImgs = Array.from(bestContainer.querySelectorAll("img"));
-                log(`Found ${allImgs.length} images in best container.`);
-                
-                const validImages = [];
-                const seen = new Set();
-                
-                for (const img of allImgs) {
-                     // Get src from multiple possible attributes
-                     let src = img.src || img.dataset?.src || img.dataset?.lazySrc || "";
-                     if (!src && img.srcset) {
-                         src = img.srcset.split(',')[0].trim().split(' ')[0];
-                     }
-                     
-                     if (!src || src.includes('data:image') || src.includes('placeholder')) continue;
-                     
-                     const srcLowerG = src.toLowerCase();
-                     // Skip logos and icons
-                     if (srcLowerG.includes('logo') || srcLowerG.includes('icon')) continue;
-                     // Skip Shopify collection/category images (never size charts)
-                     if (srcLowerG.includes('/collections/') || srcLowerG.includes('/collection/')) continue;
-                     
-                     // Smart SVG filter: block icon-like SVGs, allow size-chart SVGs
-                     if (srcLowerG.endsWith('.svg') || srcLowerG.includes('.svg?')) {
-                         const svgName = srcLowerG.split('/').pop().split('?')[0];
-                         if (!/size|chart|guide|measurement/i.test(svgName)) continue;
-                     }
-                     
-                     let score = 0;
-                     const srcLower = src.toLowerCase();
-                     const alt = (img.alt || "").toLowerCase();
-                     
-                     // Keyword matching
-                     if (keywords.test(srcLower) || keywords.test(alt)) score += 30;
-                     if (srcLower.includes('size') || srcLower.includes('chart') || srcLower.includes('guide')) score += 20;
-                     if (srcLower.includes('measurement') || srcLower.includes('dimension')) score += 20;
-                     
-                     // Container context boost
-                     if (bestContainer.className?.includes?.("sizechart") || bestContainer.className?.includes?.("ilm")) score += 20;
-                     if (bestContainer.className?.includes?.("mfp-content")) score += 15;
-                     
-                     // Size validation - more lenient
-                     const naturalWidth = img.naturalWidth || parseInt(img.width) || 0;
-                     const naturalHeight = img.naturalHeight || parseInt(img.height) || 0;
-                     const hasSize = naturalWidth > 30 || naturalHeight > 30;
-                     
-                     if (!seen.has(src)) {
-                         // ONLY include images with size-related keywords (score > 0)
-                         // Ignore generic product images with score 0
-                         if (score > 0) {
-                             validImages.push({ src: src, score: score, w: naturalWidth, h: naturalHeight });
-                             seen.add(src);
-                             log(`Image: ${src.substring(0, 60)}... Score: ${score} Size: ${naturalWidth}x${naturalHeight}`);
-                         } else {
-                             log(`Skipped (no size keywords, score=0): ${src.substring(0, 60)}...`);
-                         }
-                     }
-                }
-                
-                // Also check for iframes with size chart content
-                const iframes = bestContainer.querySelectorAll("iframe");
-                for (const iframe of iframes) {
-                    try {
-                        const iframeSrc = iframe.src || "";
-                        if (keywords.test(iframeSrc)) {
-                            log(`Found size chart iframe: ${iframeSrc}`);
-                            validImages.push({ src: iframeSrc, score: 50, w: 0, h: 0 });
-                        }
-                    } catch(e) {}
-                }
-                
-                validImages.sort((a,b) => b.score - a.score);
-                // Limit to max 3 images to avoid returning too many
-                const topImages = validImages.slice(0, 3);
-                const finalImages = topImages.map(i => i.src);
-                
-                // If no images or tables found, try to extract text/HTML content
-                // ONLY for specific domains that use text-only size info (like dopamean.in)
-                let textHtml = null;
-                const textOnlyBrands = ['dopamean.in'];
-                const currentDomain = window.location.hostname.replace('www.', '');
-                
-                if (finalImages.length === 0 && allTables.length === 0 && bestContainer && textOnlyBrands.includes(currentDomain)) {
-                    // Check if container has meaningful text content with size keywords
-                    const textContent = bestContainer.innerText || "";
-                    log(`Text content length: ${textContent.length}, preview: ${textContent.substring(0, 80).replace(/\\n/g, ' ')}...`);
-                    
-                    // More inclusive regex for size-related content
-                    const sizeKeywords = /\\b(size|cm|inch|chest|waist|length|shoulder|sleeve|fit|measurements?|dimensions?|small|medium|large|xs|xl|xxl|armhole|bust|hip)\\b/i;
-                    if (sizeKeywords.test(textContent) && textContent.length > 20 && textContent.length < 5000) {
-                        // Clean and return the HTML
-                        textHtml = bestContainer.innerHTML;
-                        log(`Found text-based size info: ${textContent.substring(0, 100).replace(/\\n/g, ' ')}...`);
-                    } else {
-                        log(`Text does not match size keywords or length requirements`);
-                    }
-                }
-
-                return { table: allTables.length ? allTables[0] : null, images: finalImages, textHtml: textHtml, logs: logs };
-            }
-        """)
+        result = await run_page_script(page, 'extractContainer', verbose=self.verbose)
         
-        for msg in result.get('logs', []):
-            print(f"EXTRACT LOG: {msg}")
+        print_logs("EXTRACT LOG", result.get('logs'), self.verbose)
             
         return result
 
@@ -1049,48 +1456,113 @@ class SizeChartScraper:
                 elif len(images) > 0:
                         return [images[-1] if isinstance(images[-1], str) else images[-1].get('src')]
         except Exception as e:
-            print(f"JSON Fallback failed: {e}")
+            logger.info(f"JSON Fallback failed: {e}")
         return []
 
     def print_result(self, result):
-        print("\n====== SIZE CHART RESULT ======\n")
+        logger.info("\n====== SIZE CHART RESULT ======\n")
         found = False
         if result['table']:
-            print(f"[TABLE] Found Table (Data):")
+            logger.info(f"[TABLE] Found Table (Data):")
             for row in result['table']:
-                print(" | ".join(row))
-            print("\n")
+                logger.info(" | ".join(row))
+            logger.info("\n")
             found = True
         
         if result['images']:
-            print(f"[IMAGES] Found Images (Ranked):")
+            logger.info(f"[IMAGES] Found Images (Ranked):")
             for img in result['images']:
-                print(img)
-            print("\n")
+                logger.info(img)
+            logger.info("\n")
             found = True
         
         if result.get('textHtml'):
-            print(f"[TEXT HTML] Found Text-based Size Info:")
+            logger.info(f"[TEXT HTML] Found Text-based Size Info:")
             # Show first 500 chars of HTML
             html_preview = result['textHtml'][:500] + "..." if len(result['textHtml']) > 500 else result['textHtml']
-            print(html_preview)
-            print(f"\n[HTML Length: {len(result['textHtml'])} chars]")
+            logger.info(html_preview)
+            logger.info(f"\n[HTML Length: {len(result['textHtml'])} chars]")
             found = True
             
         if not found:
-            print("[NONE] No size chart found.")
+            logger.info("[NONE] No size chart found.")
+
+class SizeChartBrowser:
+    """
+    One long-lived persistent context for scraping many URLs: started once,
+    each scrape only opens (and closes) a page. At most `max_pages` pages are
+    open at once; the brand cache is saved on close if any scrape changed it.
+    """
+
+    def __init__(self, headless=True, max_pages=8, verbose=DEBUG):
+        self.headless = headless
+        self.verbose = verbose
+        self.user_data_dir = os.path.abspath("./user_data")
+        self.playwright = None
+        self.context = None
+        self.page_slots = asyncio.Semaphore(max_pages)
+        self.brand_cache_dirty = False
+
+    async def start(self):
+        if self.context is None:
+            self.playwright = await async_playwright().start()
+            self.context = await launch_context(self.playwright, self.user_data_dir, self.headless)
+        return self
+
+    async def scrape(self, url):
+        """Scrape one URL in its own page; returns the result dict, or None if the scrape failed."""
+        scraper = SizeChartScraper(url, headless=self.headless, verbose=self.verbose)
+        async with self.page_slots:
+            try:
+                return await scraper.run_on(self.context)
+            except Exception as e:
+                logger.info(f"Scrape failed for {url}: {e}")
+                return None
+            finally:
+                self.brand_cache_dirty = self.brand_cache_dirty or scraper.brand_cache_dirty
+
+    async def close(self):
+        if self.context is not None:
+            await self.context.close()
+            self.context = None
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+        if self.brand_cache_dirty:
+            save_brand_cache(get_brand_cache())
+            self.brand_cache_dirty = False
+
+async def run_many(urls, headless=True, concurrency=8, verbose=DEBUG):
+    """
+    Scrape several URLs in one browser: each gets its own page in a shared
+    persistent context, with at most `concurrency` pages open at once.
+    Returns the result dicts in the order of `urls` (None where a scrape failed).
+    """
+    browser = await SizeChartBrowser(headless=headless, max_pages=concurrency, verbose=verbose).start()
+    try:
+        return await asyncio.gather(*[browser.scrape(url) for url in urls])
+    finally:
+        await browser.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Size Chart Scraper")
-    parser.add_argument("url", nargs="?", help="Product URL")
+    parser.add_argument("urls", nargs="*", help="Product URL(s)")
+    parser.add_argument("--urls-file", help="File with one product URL per line ('-' for stdin), scraped in one browser")
+    parser.add_argument("--concurrency", type=int, default=8, help="Pages open at once when given several URLs")
     parser.add_argument("--headless", action="store_true", help="Run in headless mode", default=True)
     parser.add_argument("--no-headless", action="store_false", dest="headless", help="Run in visible mode")
+    parser.add_argument("--verbose", action="store_true", default=DEBUG, help="Print the page scripts' logs (same as SC_DEBUG=1)")
     
     args = parser.parse_args()
     
-    url = args.url
-    if not url:
-        url = ask_url()
-        
-    scraper = SizeChartScraper(url, headless=args.headless)
-    asyncio.run(scraper.run())
+    urls = list(args.urls)
+    if args.urls_file:
+        with (sys.stdin if args.urls_file == "-" else open(args.urls_file, encoding="utf-8")) as f:
+            urls.extend(line.strip() for line in f if line.strip())
+    urls = urls or [ask_url()]
+    
+    if len(urls) > 1:
+        asyncio.run(run_many(urls, headless=args.headless, concurrency=args.concurrency, verbose=args.verbose))
+    else:
+        scraper = SizeChartScraper(urls[0], headless=args.headless, verbose=args.verbose)
+        asyncio.run(scraper.run())
@@ -0,0 +1,53 @@
+"""The static parser and the in-page extractor must give the same result for the same HTML."""
+import asyncio
+import importlib.util
+import os
+import unittest
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+HAVE_DEPS = all(importlib.util.find_spec(name) for name in ("httpx", "playwright"))
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@unittest.skipUnless(HAVE_DEPS, "needs httpx and playwright")
+class ExtractorParityTest(unittest.TestCase):
+
+    def extract_in_browser(self, html, fields):
+        from playwright.async_api import async_playwright
+        from generic_product_scraper import EXTRACTOR_JS, SELECTORS_INIT_SCRIPT
+
+        async def run():
+            async with async_playwright() as p:
+                browser = await p.chromium.launch()
+                try:
+                    page = await browser.new_page()
+                    await page.set_content(html)
+                    await page.evaluate(SELECTORS_INIT_SCRIPT + "\n" + EXTRACTOR_JS)
+                    return await page.evaluate("fields => extractProduct(fields)", list(fields))
+                finally:
+                    await browser.close()
+
+        return asyncio.run(run())
+
+    def test_woo_sale_page(self):
+        from generic_product_scraper import ALL_FIELDS, extract_static_product
+
+        html = read_fixture("woo_sale_product.html")
+        static = extract_static_product(html, ALL_FIELDS)
+        browser = self.extract_in_browser(html, ALL_FIELDS)
+
+        self.assertEqual(static["price"], 1299)
+        self.assertEqual(static["original_price"], 1999)
+        self.assertEqual(static["images"], ["https://shop.example.com/shirt-front.jpg",
+                                            "https://shop.example.com/shirt-back.jpg"])
+        self.assertEqual(" ".join(static["description"].split()), " ".join(browser["description"].split()))
+        for field in ("title", "price", "original_price", "images", "currency"):
+            self.assertEqual(static[field], browser[field], field)
+
+
+if __name__ == "__main__":
+    unittest.main()